@@ -0,0 +1,171 @@
+# batch.py
+import numpy as np
+import argparse
+import contextlib
+import csv
+import glob
+import multiprocessing
+import time
+import traceback
+from pathlib import Path
+import sys
+
+# Add the 'src' directory to the Python path
+sys.path.append(str(Path(__file__).parent / 'src'))
+
+import run_pipeline
+from frame_log import load_frame_log
+from calibration import load_calibration
+from segmented import init_worker
+
+SUMMARY_HEADERS = ['clip', 'status', 'frames', 'seconds', 'fps', 'detection_rate', 'mean_abs_offset_m', 'error']
+
+def find_clips(pattern):
+    """
+    A directory (all videos in it) or a glob pattern -> sorted list of video paths.
+    """
+    path = Path(pattern)
+    if path.is_dir():
+        paths = [p for p in path.iterdir() if p.suffix.lower() in run_pipeline.VIDEO_EXT]
+    else:
+        paths = [Path(p) for p in glob.glob(pattern, recursive=True)]
+        paths = [p for p in paths if p.suffix.lower() in run_pipeline.VIDEO_EXT]
+    return sorted(paths)
+
+def summarize_log(log_path):
+    """
+    Detection rate (both lines detected) and mean |lateral offset| of a per-frame log.
+    """
+    if log_path.suffix == '.npy':
+        log = load_frame_log(str(log_path))
+        detected = (log['left_detected'] == 1) & (log['right_detected'] == 1)
+        offsets = np.asarray(log['lat_offset_m'])
+    else:
+        with open(log_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        detected = np.array([row['left_detected'] == '1' and row['right_detected'] == '1' for row in rows])
+        offsets = np.array([float(row['lat_offset_m']) for row in rows])
+    if len(offsets) == 0:
+        return 0.0, 0.0
+    return float(np.mean(detected)), float(np.mean(np.abs(offsets)))
+
+def run_clip(job):
+    """
+    Worker: runs the pipeline on one clip into its own output folder.
+    Never raises; failures are returned in the summary row.
+    """
+    clip_path, clip_output, options = job
+    row = {'clip': str(clip_path), 'status': 'failed', 'frames': 0, 'seconds': 0.0, 'fps': 0.0,
+           'detection_rate': 0.0, 'mean_abs_offset_m': 0.0, 'error': ''}
+    clip_output.mkdir(parents=True, exist_ok=True)
+    # The pipeline's own parser fills in every option batch.py doesn't set (the preset
+    # namespace attributes take precedence over its defaults)
+    args = run_pipeline.build_parser().parse_args([str(clip_path), '--output', str(clip_output), '--headless'],
+                                                  namespace=argparse.Namespace(**options))
+
+    start = time.perf_counter()
+    try:
+        # Keep the clip's console output next to its results instead of interleaving it
+        with open(clip_output / 'run.log', 'w') as log_file, contextlib.redirect_stdout(log_file):
+            frame_count = run_pipeline.main(args)
+    except Exception as e:
+        with open(clip_output / 'run.log', 'a') as log_file:
+            traceback.print_exc(file=log_file)
+        row['error'] = f"{type(e).__name__}: {e}"
+        return row
+    row['seconds'] = time.perf_counter() - start
+
+    if not frame_count:
+        row['error'] = f"no frames processed (see {clip_output / 'run.log'})"
+        return row
+
+    ext = '.npy' if options.get('log_format') == 'npy' else '.csv'
+    row['detection_rate'], row['mean_abs_offset_m'] = summarize_log(
+        clip_output / f"{clip_path.stem}_per_frame{ext}"
+    )
+    row['status'] = 'ok'
+    row['frames'] = frame_count
+    row['fps'] = frame_count / row['seconds'] if row['seconds'] > 0 else 0.0
+    return row
+
+def main(args):
+    clips = find_clips(args.input)
+    if not clips:
+        print(f"Error: No videos found for {args.input}")
+        return 2
+    # Unattended: the profile has to exist already (no interactive calibration in the workers)
+    if load_calibration(args.calibration, args.camera) is None:
+        print(f"Error: No calibration '{args.camera}' in {args.calibration} "
+              f"(create it with run_pipeline.py --calibration ... --camera ...)")
+        return 2
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    options = {'calibration': args.calibration, 'camera': args.camera, 'video_every': args.video_every,
+               'preprocess': args.preprocess, 'scale': args.scale, 'detect_every': args.detect_every,
+               'log_format': args.log_format, 'config': args.config}
+
+    # One subfolder per clip (numbered if two clips share a name)
+    jobs = []
+    used = set()
+    for i, clip_path in enumerate(clips):
+        name = clip_path.stem if clip_path.stem not in used else f"{clip_path.stem}_{i}"
+        used.add(name)
+        jobs.append((clip_path, output_dir / name, options))
+
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Processing {len(jobs)} clips with {workers} workers...")
+    rows = []
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        for row in pool.imap_unordered(run_clip, jobs):
+            rows.append(row)
+            if row['status'] == 'ok':
+                print(f"  [{len(rows)}/{len(jobs)}] {row['clip']}: {row['frames']} frames, "
+                      f"{row['fps']:.1f} fps")
+            else:
+                print(f"  [{len(rows)}/{len(jobs)}] {row['clip']}: FAILED ({row['error']})")
+    elapsed = time.perf_counter() - start
+
+    rows.sort(key=lambda row: row['clip'])
+    summary_path = output_dir / 'batch_summary.csv'
+    with open(summary_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_HEADERS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: f"{value:.3f}" if isinstance(value, float) else value
+                             for key, value in row.items()})
+
+    failed = [row for row in rows if row['status'] != 'ok']
+    total_frames = sum(row['frames'] for row in rows)
+    print(f"Batch complete: {len(rows) - len(failed)}/{len(rows)} clips, {total_frames} frames "
+          f"in {elapsed:.1f} s ({total_frames / elapsed:.1f} fps overall)")
+    if failed:
+        print("Failed clips:")
+        for row in failed:
+            print(f"  {row['clip']}: {row['error']}")
+    print(f"Saved batch summary to: {summary_path}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the lane detection pipeline (headless) on every video "
+                                                 "in a directory or glob, in parallel worker processes.")
+    parser.add_argument('input', help="Directory of videos or a glob pattern (quote it, e.g. 'data/**/*.mp4')")
+    parser.add_argument('--calibration', required=True,
+                        help="JSON calibration profiles file (see run_pipeline.py --calibration)")
+    parser.add_argument('--camera', default='default', help="Calibration profile to use (default: 'default')")
+    parser.add_argument('--output', default='outputs', help="Output directory (one subfolder per clip)")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help="Number of clips processed in parallel (default: number of CPUs)")
+    parser.add_argument('--video-every', type=int, default=0,
+                        help="Write every Nth annotated frame to each clip's video (default 0 = no video)")
+    parser.add_argument('--preprocess', choices=['full', 'roi', 'warped'], default='full',
+                        help="Preprocessing mode, see run_pipeline.py")
+    parser.add_argument('--scale', type=float, default=1.0, help="Processing resolution, see run_pipeline.py")
+    parser.add_argument('--detect-every', type=int, default=1, help="Detection cadence, see run_pipeline.py")
+    parser.add_argument('--log-format', choices=['csv', 'npy'], default='csv', help="Per-frame log format")
+    parser.add_argument('--config', default=None, help="Pipeline thresholds JSON, see run_pipeline.py --config")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,158 @@
+# benchmark.py
+import cv2
+import numpy as np
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+import sys
+
+# Add the 'src' directory to the Python path
+sys.path.append(str(Path(__file__).parent / 'src'))
+
+from preprocess import preprocess_image
+from warp import get_warp_matrices, PerspectiveWarp
+from lane_fit import find_lane_fits
+from overlay import draw_lane_overlay
+from temporal import Line
+from metrics import define_metrics
+from detector import lane_metrics
+from synthetic import ROAD_SRC_POINTS, synthetic_frames
+
+STAGES = ['preprocess', 'warp', 'find_lane_fits', 'line_update', 'metrics', 'overlay', 'encode']
+
+def run_stages(frames, M, Minv, warper, xm_per_pix, ym_per_pix, writer):
+    """
+    Runs the pipeline stage by stage (like process_frame) and times each one.
+    Returns {stage: list of per-frame seconds}.
+    """
+    timings = {stage: [] for stage in STAGES}
+    left_line = Line(alpha=0.1)
+    right_line = Line(alpha=0.1)
+
+    for frame in frames:
+        t0 = time.perf_counter()
+        binary_mask = preprocess_image(frame)
+        t1 = time.perf_counter()
+        warped_binary = warper.warp(binary_mask)
+        t2 = time.perf_counter()
+        left_fit, right_fit, _, l_count, r_count = find_lane_fits(warped_binary, left_line, right_line)
+        t3 = time.perf_counter()
+        left_line.update(left_fit, l_count)
+        right_line.update(right_fit, r_count)
+        t4 = time.perf_counter()
+
+        lat_offset_m, avg_curve_rad_m = lane_metrics(left_line, right_line, (frame.shape[1], frame.shape[0]),
+                                                     xm_per_pix, ym_per_pix)
+        t5 = time.perf_counter()
+
+        final_overlay = draw_lane_overlay(frame.copy(), Minv, left_line, right_line,
+                                          lat_offset_m, avg_curve_rad_m)
+        t6 = time.perf_counter()
+        writer.write(final_overlay)
+        t7 = time.perf_counter()
+
+        for stage, (start, end) in zip(STAGES, [(t0, t1), (t1, t2), (t2, t3), (t3, t4),
+                                                (t4, t5), (t5, t6), (t6, t7)]):
+            timings[stage].append(end - start)
+
+    return timings
+
+def summarize(timings):
+    """
+    Per-stage throughput and latency percentiles (milliseconds).
+    """
+    results = {}
+    total = np.sum([timings[stage] for stage in STAGES], axis=0)
+    for stage, values in list(timings.items()) + [('total', total)]:
+        ms = np.asarray(values) * 1000
+        results[stage] = {
+            'mean_ms': float(np.mean(ms)),
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'fps': float(1000 / np.mean(ms)) if np.mean(ms) > 0 else float('inf'),
+        }
+    return results
+
+def compare_to_baseline(results, baseline, threshold, metric='p50_ms'):
+    """
+    Returns a list of (stage, baseline, current) for stages slower than baseline * (1 + threshold).
+    """
+    regressions = []
+    for stage, stats in results.items():
+        if stage not in baseline:
+            continue
+        base = baseline[stage][metric]
+        if stats[metric] > base * (1 + threshold):
+            regressions.append((stage, base, stats[metric]))
+    return regressions
+
+def main(args):
+    image = cv2.imread(str(args.image))
+    if image is None:
+        print(f"Error: Could not load {args.image}")
+        return 2
+    img_size = (image.shape[1], image.shape[0])
+
+    M, Minv = get_warp_matrices(img_size, ROAD_SRC_POINTS)
+    warper = PerspectiveWarp(M, Minv, img_size)
+    xm_per_pix, ym_per_pix = define_metrics(img_size, img_size[0] - (300 * 2))
+
+    # Decode cost is not part of the pipeline stages: build the clip up front
+    frames = list(synthetic_frames(image, args.frames, seed=args.seed))
+
+    timings = {stage: [] for stage in STAGES}
+    with tempfile.TemporaryDirectory() as tmp:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        writer = cv2.VideoWriter(str(Path(tmp) / 'bench.mp4'), fourcc, 25, img_size)
+        for _ in range(args.repeat):
+            run_timings = run_stages(frames, M, Minv, warper, xm_per_pix, ym_per_pix, writer)
+            for stage in STAGES:
+                timings[stage].extend(run_timings[stage])
+        writer.release()
+
+    results = summarize(timings)
+
+    print(f"{'stage':<16}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'fps':>10}")
+    for stage, stats in results.items():
+        print(f"{stage:<16}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['fps']:>10.1f}")
+
+    report = {'frames': args.frames, 'repeat': args.repeat, 'image_size': list(img_size), 'stages': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved benchmark results to: {args.output}")
+
+    if args.baseline:
+        if not Path(args.baseline).exists():
+            print(f"Baseline {args.baseline} not found, nothing to compare against.")
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)['stages']
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"REGRESSION (> {args.threshold:.0%} slower p50 than {args.baseline}):")
+            for stage, base, current in regressions:
+                print(f"  {stage}: {base:.2f} ms -> {current:.2f} ms")
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the lane detection pipeline "
+                                                 "on a synthetic clip built from a single road image.")
+    parser.add_argument('--image', default=str(Path(__file__).parent / 'data' / 'road.png'),
+                        help="Road image to build the synthetic clip from (default: data/road.png)")
+    parser.add_argument('--frames', type=int, default=100, help="Frames in the synthetic clip")
+    parser.add_argument('--repeat', type=int, default=3, help="How many times to run the clip")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic noise")
+    parser.add_argument('--output', default=None, help="Write the results to this JSON file")
+    parser.add_argument('--baseline', default=None, help="Compare against this results JSON")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Allowed slowdown of a stage's p50 vs. the baseline (0.10 = 10%%)")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -10,14 +10,21 @@ import sys
 sys.path.append(str(Path(__file__).parent / 'src'))
 
 try:
-    from preprocess import preprocess_image
-    from warp import get_user_warp_points, get_warp_matrices, warp_image
-    from lane_fit import find_lane_fits
-    from overlay import draw_lane_overlay
+    from warp import get_user_warp_points, get_warp_roi, PerspectiveWarp, scale_homography
+    from detector import fit_lanes, lane_metrics, process_frame, render_overlay, collage_images
     from temporal import Line
     from debug_utils import create_debug_collage
     from csv_writer import CSVWriter
-    from metrics import define_metrics, calculate_curvature_m, calculate_offset_m # <--- NEW
+    from frame_log import FrameLogWriter, frame_row, frame_log_to_csv
+    from video_io import FrameReader
+    from sinks import OutputSinks, CsvSink, VideoSink, JpegSink, CollageSink, SinkPolicy, parse_policy
+    from segmented import run_segmented, compare_csv_logs, merge_video_chunks
+    from scheduler import DetectionScheduler
+    from profiling import StageTimer, run_profiled, timed
+    from calibration import make_calibration, load_calibration, save_calibration, auto_calibrate
+    from config import DEFAULT_CONFIG, load_config
+    from mask_cache import MaskCacheWriter, cache_path, load_mask_cache, iter_masks
+    from checkpoint import save_checkpoint, load_checkpoint, settings_mismatch, remove_checkpoint
 except ImportError as e:
     print(f"Error: {e}")
     print("Please make sure all module files (preprocess.py, warp.py, etc.) are in the 'src' directory.")
@@ -26,63 +33,46 @@ except ImportError as e:
 IMAGE_EXT = ['.jpg', '.jpeg', '.png']
 VIDEO_EXT = ['.mp4', '.avi', '.mov']
 
-def process_frame(frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=False):
-    """
-    Runs the full pipeline on one frame.
-    """
-    img_height, img_width = frame.shape[:2]
-    ploty = np.linspace(0, img_height - 1, img_height)
-
-    # 1. Preprocessing
-    binary_mask = preprocess_image(frame)
-    
-    # 2. Perspective Transform
-    warped_binary = warp_image(binary_mask, M)
-    
-    # 3. Find raw lane fits
-    left_fit_raw, right_fit_raw, warped_debug_img, l_count, r_count = find_lane_fits(warped_binary)
-    
-    # 4. Update smoothers
-    left_line.update(left_fit_raw, l_count)
-    right_line.update(right_fit_raw, r_count)
-    
-    # 5. Calculate Metrics
-    lat_offset_m = 0.0
-    avg_curve_rad_m = 0.0
-    
-    if left_line.detected and right_line.detected:
-        # Calculate offset
-        lat_offset_m = calculate_offset_m(left_line.current_fit, right_line.current_fit, 
-            img_width, xm_per_pix)
-        
-        # Calculate curvature
-        left_curve, right_curve = calculate_curvature_m(
-            left_line.current_fit, right_line.current_fit, 
-            ploty, xm_per_pix, ym_per_pix
-        )
-        avg_curve_rad_m = (left_curve + right_curve) / 2
-        
-    # 6. Draw final overlay
-    final_overlay = draw_lane_overlay(frame.copy(), Minv, left_line, right_line, 
-        lat_offset_m, avg_curve_rad_m)
-    
-    if get_debug:
-        debug_images = {
-            'original': frame.copy(),
-            'binary': binary_mask, 
-            'warped': warped_debug_img,
-            'final': final_overlay
-        }
-        return final_overlay, debug_images, left_line, right_line, lat_offset_m
-    
-    return final_overlay, None, left_line, right_line, lat_offset_m
-
 def main(args):
+    headless = args.headless
+    threaded = args.threaded
+    queue_size = args.queue_size
+    segments = args.segments
+    preprocess_mode = args.preprocess
+    scale = args.scale
+    detect_every = args.detect_every
+    extrapolate = args.extrapolate
+    stage_timing = args.stage_timing
+    log_format = args.log_format
+    video_every = args.video_every
+    video_policy = parse_policy(args.video_policy)
+    jpeg_policy = parse_policy(args.jpeg_policy)
+    collage_policy = parse_policy(args.collage_policy)
+    mask_cache_dir = args.mask_cache
+    replay = args.replay
+    checkpoint_every = args.checkpoint_every
+    resume = args.resume
+    start_frame = args.start_frame
+    end_frame = args.end_frame
+    if video_every is None:
+        # Headless runs only log metrics unless a video sample rate is asked for
+        video_every = 0 if headless else 1
+
     input_path = Path(args.input)
     output_dir = Path(args.output)
     output_dir.mkdir(exist_ok=True)
     
     if not input_path.exists(): ...
+    config = DEFAULT_CONFIG
+    config_path = args.config
+    if config_path:
+        try:
+            config = load_config(config_path)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load config {config_path}: {e}")
+            return
+        print(f"Loaded pipeline config from: {config_path}")
+    
     ext = input_path.suffix.lower(); is_video = ext in VIDEO_EXT; first_frame = None; cap = None
     if is_video:
         cap = cv2.VideoCapture(str(input_path)); ret, first_frame = cap.read()
@@ -95,81 +85,536 @@ def main(args):
         if cap: cap.release(); return
 
     img_size = (first_frame.shape[1], first_frame.shape[0])
+    segmented = is_video and segments > 1
     
-    print("Waiting for user calibration...")
-    src_points = get_user_warp_points(first_frame)
+    # Checkpoint of an interrupted run of this input (see --checkpoint-every)
+    checkpoint_path = output_dir / f"{input_path.stem}_checkpoint.json"
+    checkpoint = None
+    if resume:
+        if not is_video or segmented:
+            print("Error: --resume is only supported for serial video runs.")
+            if cap: cap.release()
+            return
+        checkpoint = load_checkpoint(str(checkpoint_path))
+        if checkpoint is None:
+            print(f"Error: No checkpoint to resume from at {checkpoint_path}")
+            cap.release()
+            return
     
-    # Define metrics based on calibration
-    # We pass the 'offset' (300) from warp.py * 2
-    warped_lane_width_px = img_size[0] - (300 * 2) 
-    xm_per_pix, ym_per_pix = define_metrics(img_size, warped_lane_width_px)
+    # Saved calibration profile for this camera, or interactive calibration (saved if a file is given)
+    calibration_path = args.calibration
+    camera = args.camera
+    calibration = None
+    if checkpoint is not None:
+        # Same warp as the interrupted run, no need to calibrate again
+        calibration = make_calibration(checkpoint['src_points'], img_size)
+    elif calibration_path:
+        calibration = load_calibration(calibration_path, camera)
+        if calibration is not None and calibration['img_size'] != img_size:
+            print(f"Error: Calibration '{camera}' is for {calibration['img_size'][0]}x{calibration['img_size'][1]}, "
+                  f"the input is {img_size[0]}x{img_size[1]}.")
+            if cap: cap.release()
+            return
+    if calibration is None:
+        src_points = None
+        if args.auto_calibrate:
+            # Estimate the trapezoid from the first frames (read separately, the main capture stays put)
+            frames = [first_frame]
+            if is_video:
+                calib_cap = cv2.VideoCapture(str(input_path))
+                while len(frames) < args.calibration_frames:
+                    ret, frame = calib_cap.read()
+                    if not ret: break
+                    frames.append(frame)
+                calib_cap.release()
+            src_points = auto_calibrate(frames)
+            if src_points is not None:
+                print(f"Auto-calibrated from {len(frames)} frames: {src_points.tolist()}")
+            elif headless:
+                print("Error: Auto-calibration failed (no plausible lane trapezoid found).")
+                if cap: cap.release()
+                return
+            else:
+                print("Auto-calibration failed, falling back to manual calibration.")
+        if src_points is None:
+            print("Waiting for user calibration...")
+            src_points = get_user_warp_points(first_frame)
+        calibration = make_calibration(src_points, img_size)
+        if calibration_path:
+            save_calibration(calibration_path, calibration, camera)
+            print(f"Saved calibration '{camera}' to: {calibration_path}")
+    elif checkpoint is not None:
+        print(f"Using the calibration of the checkpoint {checkpoint_path}")
+    else:
+        print(f"Loaded calibration '{camera}' from: {calibration_path}")
     
-    M, Minv = get_warp_matrices(img_size, src_points)
+    M, Minv = calibration['M'], calibration['Minv']
+    xm_per_pix, ym_per_pix = calibration['xm_per_pix'], calibration['ym_per_pix']
+    
+    # Calibration at the processing resolution (the ROI and warp maps live there)
+    proc_M, proc_Minv, proc_size = M, Minv, img_size
+    if scale != 1.0:
+        proc_M = scale_homography(M, scale)
+        proc_Minv = scale_homography(Minv, scale)
+        proc_size = (int(round(img_size[0] * scale)), int(round(img_size[1] * scale)))
+        print(f"Processing at {proc_size[0]}x{proc_size[1]} (scale {scale})")
+    
+    roi = None
+    if preprocess_mode == 'roi':
+        roi = get_warp_roi(proc_size, proc_Minv)
+        if roi is None:
+            print("Warning: warped view reaches above the horizon, preprocessing the full frame.")
+        else:
+            x0, y0, x1, y1 = roi
+            coverage = (x1 - x0) * (y1 - y0) / (proc_size[0] * proc_size[1])
+            print(f"Preprocessing ROI: {roi} ({coverage:.0%} of the frame)")
+    
+    # Precomputed remap tables for the warp
+    warp_maps = args.warp_maps
+    warper = None
+    if warp_maps and Path(warp_maps).exists():
+        warper = PerspectiveWarp.load(warp_maps, proc_M, proc_Minv, proc_size)
+        if warper is None:
+            print(f"Warp maps in {warp_maps} do not match this calibration, rebuilding.")
+    if warper is None:
+        warper = PerspectiveWarp(proc_M, proc_Minv, proc_size)
+        if warp_maps:
+            warper.save(warp_maps)
+            print(f"Saved warp maps to: {warp_maps}")
+    
+    frame_kwargs = {'preprocess_mode': preprocess_mode, 'roi': roi, 'warper': warper, 'scale': scale,
+                    'config': config}
     print("Calibration complete. Processing...")
     
-    left_line = Line(alpha=0.1)
-    right_line = Line(alpha=0.1)
+    line_args = {'alpha': config.alpha, 'max_frames_lost': config.max_frames_lost}
+    left_line = Line(**line_args)
+    right_line = Line(**line_args)
+    
+    # Adaptive detection cadence (full detection only every Nth frame while stable)
+    scheduler_args = None
+    scheduler = None
+    if detect_every > 1:
+        scheduler_args = {'interval': detect_every, 'extrapolate': extrapolate}
+        scheduler = DetectionScheduler(**scheduler_args)
     
     csv_path = output_dir / f"{input_path.stem}_per_frame.csv"
     headers = ["frame_id", "left_detected", "right_detected", "left_conf", "right_conf", "lat_offset_m"]
-    csv_log = CSVWriter(str(csv_path), headers)
+    if scheduler is not None:
+        headers.append("measured") # 1 if detection ran on this frame
+    
+    # Per-frame stage timing and pixel counts as extra CSV columns
+    timer = None
+    if stage_timing:
+        if is_video and segments > 1:
+            print("Warning: --stage-timing is not supported with --segments, ignoring it.")
+        else:
+            timer = StageTimer()
+            headers += StageTimer.csv_headers()
     
-    # Process First Frame
+    # Partial runs: continue after the checkpoint, or start at --start-frame (video only)
+    first_id = 0
+    run_settings = {'input': str(input_path.resolve()), 'img_size': list(img_size), 'preprocess': preprocess_mode,
+                    'scale': scale, 'detect_every': detect_every, 'extrapolate': extrapolate,
+                    'log_format': log_format, 'headers': headers, 'config': config.to_dict(),
+                    'video': video_policy is not None or video_every > 0}
+    if checkpoint is not None:
+        mismatch = settings_mismatch(checkpoint, run_settings)
+        if mismatch:
+            print(f"Error: The checkpoint was written with different settings ({', '.join(mismatch)}), "
+                  f"run with the same options to resume.")
+            cap.release()
+            return
+        first_id = checkpoint['frame_id']
+        print(f"Resuming from frame {first_id}")
+    elif start_frame > 0:
+        if is_video and not segmented:
+            first_id = start_frame
+        else:
+            print("Warning: --start-frame is only supported for serial video runs, ignoring it.")
+    if (end_frame is not None or checkpoint_every > 0) and (not is_video or segmented):
+        print("Warning: --end-frame/--checkpoint-every are only supported for serial video runs, ignoring them.")
+        end_frame, checkpoint_every = None, 0
+    
+    log_kwargs = {'frame_id': first_id}
+    if checkpoint is not None:
+        log_kwargs['resume_offset'] = checkpoint['log_offset'] # Append to the log, after the checkpointed rows
+    if log_format == 'npy':
+        # Same columns plus full-precision fits, curvature and pixel counts, in a binary .npy
+        csv_path = output_dir / f"{input_path.stem}_per_frame.npy"
+        csv_log = FrameLogWriter(str(csv_path), headers, **log_kwargs)
+    else:
+        csv_log = CSVWriter(str(csv_path), headers, **log_kwargs)
+    
+    # Warped mask cache: replay the cached masks (fitting only) or record them for later replays
+    mask_writer = None
+    replay_cache = None
+    if mask_cache_dir or replay:
+        if not mask_cache_dir:
+            print("Warning: --replay needs --mask-cache, ignoring it.")
+        elif not is_video or segmented or scheduler is not None or first_id > 0 or end_frame is not None:
+            print("Warning: --mask-cache is only supported for complete serial video runs without --detect-every, "
+                  "ignoring it.")
+        else:
+            mask_settings = {'preprocess': preprocess_mode, 'scale': scale, **config.preprocess_settings()}
+            mask_path = cache_path(mask_cache_dir, str(input_path), M, mask_settings)
+            if replay:
+                replay_cache = load_mask_cache(mask_path)
+                if replay_cache is None:
+                    print(f"No mask cache at {mask_path} yet, recording it.")
+            if replay_cache is None:
+                mask_writer = MaskCacheWriter(mask_path, {'input': str(input_path), **mask_settings})
+    
+    if first_id > 0:
+        if checkpoint is not None:
+            left_line.set_state(checkpoint['left_line'])
+            right_line.set_state(checkpoint['right_line'])
+            if scheduler is not None:
+                scheduler.set_state(checkpoint['scheduler'])
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_id)
+        else:
+            # Warm-up: run the frames before the start (no output) so the smoothing converges
+            warmup = min(args.warmup_frames, first_id)
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_id - warmup)
+            for _ in range(warmup):
+                ret, frame = cap.read()
+                if not ret: break
+                process_frame(frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, render=False,
+                              **frame_kwargs)
+                if scheduler is not None:
+                    scheduler.update(True, left_line, right_line)
+            print(f"Starting at frame {first_id} ({warmup} warm-up frames)")
+        ret, first_frame = cap.read()
+        if not ret:
+            print(f"Error: Could not read frame {first_id} of the video.")
+            cap.release()
+            csv_log.close()
+            return
+    
+    # Process First Frame (always measured for its debug collage; a resumed run has no
+    # collage and keeps the cadence of the interrupted run)
+    measure = True
+    if scheduler is not None and checkpoint is not None:
+        measure = scheduler.should_measure(left_line, right_line)
+        if not measure:
+            scheduler.predict(left_line, right_line)
     processed_frame, debug_images, ll, rl, lat_offset_m = process_frame(
-        first_frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=True
+        first_frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=True,
+        render=not headless or video_every > 0, measure=measure, timer=timer, mask_cache=mask_writer,
+        **frame_kwargs
     )
     
-    csv_log.write_frame(ll, rl, lat_offset_m) # <--- Pass real offset
+    if scheduler is not None:
+        scheduler.update(measure, ll, rl)
+    # Log columns: 'measured' only with a scheduler, the fits and curvature only in .npy logs
+    detail_args = (img_size[1], xm_per_pix, ym_per_pix) if log_format == 'npy' else None
+    csv_values, details = frame_row(ll, rl, lat_offset_m, measure if scheduler is not None else None, timer,
+                                    detail_args)
+    
+    if not is_video:
+        csv_log.write_values(*csv_values, **details)
     
-    collage_path = output_dir / f"{input_path.stem}_debug_collage.jpg"
-    cv2.imwrite(str(collage_path), create_debug_collage(debug_images))
-    print(f"Saved debug collage to: {collage_path}")
+    if processed_frame is not None and checkpoint is None:
+        collage_path = output_dir / f"{input_path.stem}_debug_collage.jpg"
+        cv2.imwrite(str(collage_path), create_debug_collage(debug_images))
+        print(f"Saved debug collage to: {collage_path}")
 
+    # Process Video in parallel segments
+    if segmented:
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        
+        out_path = None
+        if video_every > 0:
+            out_path = str(output_dir / f"{input_path.stem}_annotated.mp4")
+        if video_policy or jpeg_policy or collage_policy:
+            print("Warning: --video-policy/--jpeg-policy/--collage-policy are not supported with --segments, "
+                  "use --video-every.")
+        
+        frame_count = run_segmented(
+            input_path, n_frames, segments, args.warmup_frames, process_frame,
+            (M, Minv, xm_per_pix, ym_per_pix), csv_log, out_path=out_path, fps=fps,
+            img_size=img_size, video_every=video_every, line_args=line_args,
+            frame_kwargs=frame_kwargs, scheduler_args=scheduler_args, log_details=log_format == 'npy'
+        )
+        print(f"Video processing complete! Processed {frame_count} frames in {segments} segments")
+        
+        check_against = args.check_against
+        if check_against:
+            csv_log.close()
+            if log_format == 'npy':
+                csv_path = frame_log_to_csv(str(csv_path))
+            ok, report = compare_csv_logs(str(csv_path), check_against)
+            print(f"Check against {check_against}: {'OK' if ok else 'MISMATCH'} {report}")
+    
     # Process Video
-    if is_video:
+    elif is_video:
+        # Output sinks, each writing on its own thread; the image sinks only get the
+        # frames their policy selects (the overlay is only rendered for those)
         fps = int(cap.get(cv2.CAP_PROP_FPS))
-        out_path = str(output_dir / f"{input_path.stem}_annotated.mp4")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(out_path, fourcc, fps, img_size)
+        video_sink = jpeg_sink = collage_sink = None
         
-        out.write(processed_frame)
+        # Replaying the cached warped masks: no decoding, preprocessing or warping, only fitting
+        # and smoothing, so there are no frames to annotate
+        masks = None
+        if replay_cache is not None:
+            packed, info = replay_cache
+            masks = iter_masks(packed, info['width'], start=1)
+            if video_policy or jpeg_policy or collage_policy or (video_every > 0 and not headless):
+                print("Note: --replay only writes the per-frame log (no frames to annotate).")
+            video_every = checkpoint_every = 0
+            video_policy = jpeg_policy = collage_policy = None
+        if video_policy is None and video_every > 0:
+            video_policy = SinkPolicy(every=video_every)
         
-        frame_count = 1
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
+        # With checkpoints the video is written in parts, each one complete at its checkpoint,
+        # and merged at the end (an interrupted mp4 is not playable)
+        checkpointing = checkpoint_every > 0 or checkpoint is not None
+        video_parts = list(checkpoint['video_parts']) if checkpoint is not None else []
+        def part_path(frame_id):
+            return str(output_dir / f"{input_path.stem}_annotated.part{frame_id:07d}.mp4")
+        
+        if video_policy is not None:
+            out_path = str(output_dir / f"{input_path.stem}_annotated.mp4")
+            video_sink = VideoSink(part_path(first_id) if checkpointing else out_path, fps, img_size, video_policy,
+                                   queue_size)
+        if jpeg_policy is not None:
+            jpeg_sink = JpegSink(str(output_dir / f"{input_path.stem}_frames"), input_path.stem, jpeg_policy,
+                                 queue_size)
+        if collage_policy is not None:
+            collage_sink = CollageSink(str(output_dir / f"{input_path.stem}_events"), input_path.stem,
+                                       collage_policy, queue_size)
+        sinks = OutputSinks(CsvSink(csv_log, queue_size), [video_sink, jpeg_sink, collage_sink])
+        if checkpoint is not None:
+            sinks.events.set_state(checkpoint['events'])
+            # The counts in the summary cover the interrupted run as well (its output is kept)
+            for sink, count in zip((video_sink, jpeg_sink, collage_sink), checkpoint.get('sink_counts', (0, 0, 0))):
+                if sink is not None:
+                    sink.count = count
+        
+        # Staged pipeline: decoding can run on its own thread as well,
+        # processing stays here (in order) because Line is stateful
+        reader = FrameReader(cap, queue_size) if threaded and masks is None else cap
+        
+        # Stop the reader and the sink threads however the loop ends (Ctrl-C included): the
+        # sinks write out what is already queued, then close() raises if one of them failed
+        recorded = False
+        try:
+            sinks.write(first_id, ll, rl, csv_values, details, overlay=processed_frame,
+                        render=lambda: render_overlay(first_frame, Minv, ll, rl, xm_per_pix, ym_per_pix),
+                        debug=lambda: debug_images)
+        
+            frame_count = first_id + 1
+            measured_count = int(measure)
+            event_count = 0
+            while True:
+                if end_frame is not None and frame_count >= end_frame:
+                    break
+                if timer is not None:
+                    timer.reset()
             
-            processed_frame, _, ll, rl, lat_offset_m = process_frame(
-                frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=False
-            )
-            out.write(processed_frame)
+                if masks is not None:
+                    mask = next(masks, None)
+                    if mask is None: break
+                    frame = processed_frame = None
+                    fit_lanes(mask, left_line, right_line, scale=scale, timer=timer, config=config)
+                    with timed(timer, 'metrics'):
+                        lat_offset_m, _ = lane_metrics(left_line, right_line, img_size, xm_per_pix, ym_per_pix)
+                    ll, rl, measure = left_line, right_line, True
+                else:
+                    ret, frame = reader.read()
+                    if not ret:
+                        recorded = True # The whole video went through (the mask cache is complete)
+                        break
+                
+                    measure = True
+                    if scheduler is not None:
+                        measure = scheduler.should_measure(left_line, right_line)
+                        if not measure:
+                            scheduler.predict(left_line, right_line)
+                
+                    # Only render the overlay here if it is shown; the sinks render their frames themselves
+                    processed_frame, _, ll, rl, lat_offset_m = process_frame(
+                        frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=False,
+                        render=not headless, measure=measure, timer=timer, mask_cache=mask_writer, **frame_kwargs
+                    )
             
-            csv_log.write_frame(ll, rl, lat_offset_m)
+                if scheduler is not None:
+                    scheduler.update(measure, ll, rl)
+                measured_count += int(measure)
             
-            cv2.imshow('Real-time Processing', processed_frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+                # Snapshot the Line state now (the sink threads run behind us)
+                csv_values, details = frame_row(ll, rl, lat_offset_m, measure if scheduler is not None else None,
+                                                timer, detail_args)
             
-            if frame_count % 100 == 0: 
-                print(f"  ... processed {frame_count} frames")
-            frame_count += 1
-        
-        cap.release()
-        out.release()
-        print(f"Video processing complete! Saved to {out_path}")
+                events = sinks.write(
+                    frame_count, ll, rl, csv_values, details, overlay=processed_frame,
+                    render=lambda: render_overlay(frame, Minv, ll, rl, xm_per_pix, ym_per_pix),
+                    debug=lambda: collage_images(frame, M, **frame_kwargs)
+                )
+                event_count += bool(events)
+            
+                if processed_frame is not None:
+                    cv2.imshow('Real-time Processing', processed_frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+            
+                if frame_count % 100 == 0: 
+                    print(f"  ... processed {frame_count} frames")
+                frame_count += 1
+            
+                # Periodic checkpoint: all outputs up to here are on disk, --resume continues at frame_count
+                if checkpoint_every > 0 and frame_count % checkpoint_every == 0:
+                    sinks.flush()
+                    if video_sink is not None:
+                        finished = video_sink.start_part(part_path(frame_count))
+                        if finished is not None:
+                            video_parts.append(finished)
+                    save_checkpoint(str(checkpoint_path), {
+                        'frame_id': frame_count, 'settings': run_settings,
+                        'src_points': np.asarray(calibration['src_points']).tolist(),
+                        'left_line': left_line.get_state(), 'right_line': right_line.get_state(),
+                        'scheduler': scheduler.get_state() if scheduler is not None else None,
+                        'events': sinks.events.get_state(), 'log_offset': csv_log.position(),
+                        'video_parts': video_parts,
+                        'sink_counts': [sink.count if sink is not None else 0
+                                        for sink in (video_sink, jpeg_sink, collage_sink)]
+                    })
+        finally:
+            if reader is not cap:
+                reader.stop()
+            cap.release()
+            if mask_writer is not None:
+                if recorded:
+                    mask_writer.close()
+                else:
+                    mask_writer.discard()
+            sinks.close()
+
+        if checkpointing:
+            if video_sink is not None:
+                if video_sink.part_count > 0:
+                    video_parts.append(video_sink.path)
+                elif os.path.exists(video_sink.path):
+                    os.remove(video_sink.path)
+                merge_video_chunks(video_parts, out_path, fps, img_size)
+                for path in video_parts:
+                    os.remove(path)
+            # The run is complete, nothing left to resume
+            remove_checkpoint(str(checkpoint_path))
+        frame_count -= first_id # Frames processed by this run
+        if scheduler is not None:
+            print(f"Full detection ran on {measured_count} of {frame_count} frames")
+        if jpeg_sink is not None or collage_sink is not None:
+            print(f"{event_count} frames with detection loss / take over events")
+        if jpeg_sink is not None:
+            print(f"Saved {jpeg_sink.count} JPEG frames to: {jpeg_sink.directory}")
+        if collage_sink is not None:
+            print(f"Saved {collage_sink.count} event collages to: {collage_sink.directory}")
+        if masks is not None:
+            print(f"Replay complete! Re-fitted {frame_count} frames from the mask cache")
+        elif video_sink is not None:
+            print(f"Video processing complete! Saved {video_sink.count} frames to {out_path}")
+        else:
+            print(f"Video processing complete! Processed {frame_count} frames (no video written)")
         
     else: # Process Image
-        final_path = output_dir / f"{input_path.stem}_annotated.jpg"
-        cv2.imwrite(str(final_path), debug_images['final'])
-        print(f"Image processing complete! Saved to {final_path}")
+        frame_count = 1
+        if processed_frame is not None:
+            final_path = output_dir / f"{input_path.stem}_annotated.jpg"
+            cv2.imwrite(str(final_path), debug_images['final'])
+            print(f"Image processing complete! Saved to {final_path}")
     
     csv_log.close()
-    cv2.destroyAllWindows()
+    if not headless:
+        cv2.destroyAllWindows()
+    return frame_count
 
 
-if __name__ == '__main__':
+def build_parser():
     parser = argparse.ArgumentParser(description="Lane Detection Pipeline. Run from the project's ROOT directory.")
     parser.add_argument('input', help="Path to the input image or video (e.g., 'data/challenge_video.mp4')")
     parser.add_argument('--output', default='outputs', help="Path to the output directory (e.g., 'outputs')")
-    args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    parser.add_argument('--config', default=None,
+                        help="JSON file of pipeline thresholds (see src/config.py), e.g. the best_config.json "
+                             "of sweep.py")
+    parser.add_argument('--calibration', default=None,
+                        help="JSON file of calibration profiles: use the --camera profile if it is there, "
+                             "otherwise calibrate interactively and save it")
+    parser.add_argument('--camera', default='default', help="Calibration profile name (default: 'default')")
+    parser.add_argument('--auto-calibrate', action='store_true',
+                        help="Estimate the lane trapezoid from the first frames instead of clicking it "
+                             "(falls back to clicking if it fails, unless --headless)")
+    parser.add_argument('--calibration-frames', type=int, default=10,
+                        help="Frames used by --auto-calibrate (default: 10)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Metrics only: no GUI window, no overlay rendering, no annotated video")
+    parser.add_argument('--video-every', type=int, default=None,
+                        help="Write every Nth annotated frame to the video (0 = no video). "
+                             "Default: 1, or 0 with --headless")
+    parser.add_argument('--video-policy', default=None,
+                        help="Which annotated frames go into the video: every:N, loss (a line's fit fails), "
+                             "takeover (TAKE OVER starts), a comma-separated mix, or off. Overrides --video-every")
+    parser.add_argument('--jpeg-policy', default=None,
+                        help="Also save annotated frames as JPEGs (<name>_frames/), same policies as --video-policy")
+    parser.add_argument('--collage-policy', default=None,
+                        help="Save debug collages (<name>_events/) for these frames, e.g. 'loss,takeover'")
+    parser.add_argument('--threaded', action='store_true',
+                        help="Decode on a background thread, overlapping it with lane fitting "
+                             "(outputs are always written on background threads)")
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help="Max frames buffered between the decode/process stages and in each output sink")
+    parser.add_argument('--preprocess', choices=['full', 'roi', 'warped'], default='full',
+                        help="Threshold the full frame, only the region that maps into the warped view, "
+                             "or the warped colour frame")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Processing resolution relative to the input (e.g. 0.5); thresholds are "
+                             "scaled and the fits rescaled back for metrics and overlay")
+    parser.add_argument('--detect-every', type=int, default=1,
+                        help="While tracking is stable, run full detection only every Nth frame and reuse "
+                             "the tracked lines in between (1 = every frame)")
+    parser.add_argument('--extrapolate', action='store_true',
+                        help="With --detect-every: extrapolate the lines on skipped frames instead of reusing them")
+    parser.add_argument('--stage-timing', action='store_true',
+                        help="Add per-stage wall-clock times (ms) and lane pixel counts to the CSV")
+    parser.add_argument('--cprofile', default=None,
+                        help="Run under cProfile, print a summary and save the stats to this file")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="Trace memory allocations and print the top allocation sites at the end")
+    parser.add_argument('--log-format', choices=['csv', 'npy'], default='csv',
+                        help="Per-frame log as CSV, or as a binary .npy with full-precision fits, curvature "
+                             "and pixel counts (convert with src/frame_log.py)")
+    parser.add_argument('--warp-maps', default=None,
+                        help="Load the precomputed warp remap tables from this .npz (built and saved if "
+                             "missing or stale)")
+    parser.add_argument('--segments', type=int, default=1,
+                        help="Split the video into N frame ranges processed in parallel worker processes")
+    parser.add_argument('--warmup-frames', type=int, default=30,
+                        help="Frames each segment (or a --start-frame run) processes before its start to "
+                             "converge the smoothing state")
+    parser.add_argument('--check-against', default=None,
+                        help="With --segments: compare the merged CSV to this (serial run) CSV")
+    parser.add_argument('--checkpoint-every', type=int, default=0,
+                        help="Save a checkpoint (<name>_checkpoint.json) every N frames so an interrupted run "
+                             "can be continued with --resume (0 = off)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its checkpoint (same input, output and options)")
+    parser.add_argument('--start-frame', type=int, default=0,
+                        help="Process the video from this frame on (after --warmup-frames warm-up frames)")
+    parser.add_argument('--end-frame', type=int, default=None,
+                        help="Stop before this frame")
+    parser.add_argument('--mask-cache', default=None,
+                        help="Record the warped lane masks of a video in this directory (bit-packed .npy, "
+                             "keyed by input, calibration, --preprocess and --scale)")
+    parser.add_argument('--replay', action='store_true',
+                        help="With --mask-cache: re-run only lane fitting and smoothing on the cached masks "
+                             "(no decoding or preprocessing); records the cache first if it is missing")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    if args.cprofile or args.tracemalloc:
+        run_profiled(main, args, cprofile_path=args.cprofile, trace_malloc=args.tracemalloc)
+    else:
+        main(args)
\ No newline at end of file
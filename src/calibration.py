@@ -0,0 +1,199 @@
+# src/calibration.py
+import json
+import os
+
+import cv2
+import numpy as np
+
+from warp import get_warp_matrices, warp_image
+from metrics import define_metrics
+from preprocess import preprocess_image
+from lane_fit import blind_search, fit_polynomial, sanity_check
+
+def make_calibration(src_points, img_size):
+    """
+    Builds a calibration profile from the 4 source points (TL, TR, BR, BL) and the frame size:
+    src_points, M, Minv, xm_per_pix, ym_per_pix and img_size.
+    """
+    src_points = np.float32(src_points)
+    M, Minv = get_warp_matrices(img_size, src_points)
+
+    # We pass the 'offset' (300) from warp.py * 2
+    warped_lane_width_px = img_size[0] - (300 * 2)
+    xm_per_pix, ym_per_pix = define_metrics(img_size, warped_lane_width_px)
+
+    return {'src_points': src_points, 'M': M, 'Minv': Minv, 'xm_per_pix': xm_per_pix,
+            'ym_per_pix': ym_per_pix, 'img_size': tuple(img_size)}
+
+def load_calibration(path, camera='default'):
+    """
+    Loads the profile of a camera from a JSON calibration file ({camera: profile, ...}).
+    Returns None if the file or the camera does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profiles = json.load(f)
+    if camera not in profiles:
+        return None
+
+    profile = profiles[camera]
+    return {'src_points': np.float32(profile['src_points']), 'M': np.float64(profile['M']),
+            'Minv': np.float64(profile['Minv']), 'xm_per_pix': float(profile['xm_per_pix']),
+            'ym_per_pix': float(profile['ym_per_pix']), 'img_size': tuple(profile['img_size'])}
+
+def save_calibration(path, calibration, camera='default'):
+    """
+    Adds (or replaces) the profile of a camera in a JSON calibration file, keeping the other cameras.
+    """
+    profiles = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            profiles = json.load(f)
+
+    profiles[camera] = {
+        'src_points': np.asarray(calibration['src_points']).tolist(),
+        'M': np.asarray(calibration['M']).tolist(),
+        'Minv': np.asarray(calibration['Minv']).tolist(),
+        'xm_per_pix': calibration['xm_per_pix'],
+        'ym_per_pix': calibration['ym_per_pix'],
+        'img_size': list(calibration['img_size']),
+    }
+    with open(path, 'w') as f:
+        json.dump(profiles, f, indent=2)
+
+def _weighted_median(values, weights):
+    order = np.argsort(values)
+    cum = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cum, cum[-1] / 2)]
+
+def lane_segments(frames, horizon=0.5, min_angle=20, max_angle=80):
+    """
+    Hough line segments (x1, y1, x2, y2) of the lane markings below the horizon, over all frames.
+    Edges are taken from the preprocess_image mask; near-horizontal and near-vertical segments
+    (shadows, car edges, poles) are dropped.
+    """
+    segments = []
+    for frame in frames:
+        mask = preprocess_image(frame)
+        mask[:int(mask.shape[0] * horizon)] = 0 # Sky and background
+        edges = cv2.Canny(mask * 255, 50, 150)
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, 30, minLineLength=30, maxLineGap=10)
+        if lines is not None:
+            segments.append(lines.reshape(-1, 4))
+    if not segments:
+        return np.empty((0, 4))
+
+    segments = np.concatenate(segments).astype(np.float64)
+    x1, y1, x2, y2 = segments.T
+    angle = np.degrees(np.arctan2(np.abs(y2 - y1), np.abs(x2 - x1)))
+    return segments[(angle > min_angle) & (angle < max_angle)]
+
+def vanishing_point(segments):
+    """
+    Length-weighted median of the intersections of every left-leaning with every right-leaning segment.
+    Returns (x, y), or None if one of the sides has no segments.
+    """
+    x1, y1, x2, y2 = segments.T
+    # Segments as lines x = a*y + b (lane markings are never horizontal after the angle filter)
+    a = (x2 - x1) / (y2 - y1)
+    b = x1 - a * y1
+    length = np.hypot(x2 - x1, y2 - y1)
+    left, right = a < 0, a > 0
+    if not left.any() or not right.any():
+        return None
+
+    y = (b[right][None, :] - b[left][:, None]) / (a[left][:, None] - a[right][None, :])
+    x = a[left][:, None] * y + b[left][:, None]
+    weights = (length[left][:, None] * length[right][None, :]).ravel()
+    return _weighted_median(x.ravel(), weights), _weighted_median(y.ravel(), weights)
+
+def lane_bottom_x(segments, vp, img_size, side, max_angle_diff=4):
+    """
+    x where the ego lane line of one side ('left'/'right') crosses the bottom row.
+    Each segment that points at the vanishing point is extended to the bottom row; the
+    strongest cluster closest to the image centre is the ego lane (not the neighbouring one).
+    Returns None if no segment on that side points at the vanishing point.
+    """
+    width, height = img_size
+    vp_x, vp_y = vp
+    x1, y1, x2, y2 = segments.T
+    mid_x, mid_y = (x1 + x2) / 2, (y1 + y2) / 2
+
+    below = mid_y > vp_y + 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (x2 - x1) / (y2 - y1)
+        slope_vp = (mid_x - vp_x) / (mid_y - vp_y)
+        bottom_x = vp_x + (mid_x - vp_x) * (height - 1 - vp_y) / (mid_y - vp_y)
+    aligned = below & (np.abs(np.degrees(np.arctan(slope) - np.arctan(slope_vp))) < max_angle_diff)
+    selected = aligned & ((bottom_x < vp_x) if side == 'left' else (bottom_x > vp_x))
+    if not selected.any():
+        return None
+    xs, lengths = bottom_x[selected], np.hypot(x2 - x1, y2 - y1)[selected]
+
+    # Length-weighted histogram of the bottom crossings, keep the strong bins
+    bin_width = width / 32
+    bins = np.arange(-width, 2 * width + bin_width, bin_width)
+    hist, _ = np.histogram(xs, bins, weights=lengths)
+    strong = np.flatnonzero(hist >= 0.25 * hist.max())
+    centers = (bins[strong] + bins[strong + 1]) / 2
+    center = centers[np.argmin(np.abs(centers - vp_x))]
+
+    near = np.abs(xs - center) <= bin_width
+    return float(np.average(xs[near], weights=lengths[near]))
+
+def check_warp_points(frames, src_points):
+    """
+    Fraction of frames whose warped lane mask gives two fits that pass lane_fit.sanity_check.
+    """
+    height, width = frames[0].shape[:2]
+    M, _ = get_warp_matrices((width, height), src_points)
+    passed = 0
+    for frame in frames:
+        warped = warp_image(preprocess_image(frame), M)
+        leftx, lefty, rightx, righty, _ = blind_search(warped)
+        left_fit, right_fit = fit_polynomial(leftx, lefty, rightx, righty, height)
+        left_fit, right_fit = sanity_check(left_fit, right_fit, height)
+        passed += left_fit is not None and right_fit is not None
+    return passed / len(frames)
+
+def auto_calibrate(frames, horizon=0.5, top=0.25, bottom=0.96, n_check=5, min_pass=0.5):
+    """
+    Estimates the lane trapezoid (TL, TR, BR, BL) from a few frames of a straight-ish road,
+    instead of clicking it in get_user_warp_points.
+    1. Hough segments of the lane mask, 2. their vanishing point, 3. the ego lane lines
+    through it, 4. the trapezoid between 'top' (fraction of the way from the vanishing
+    point down to the bottom row) and 'bottom' (fraction of the image height).
+    The result is accepted if at least min_pass of n_check frames pass the sanity check.
+    Returns the source points as float32 (4, 2), or None if the estimate failed.
+    """
+    height, width = frames[0].shape[:2]
+
+    segments = lane_segments(frames, horizon)
+    if len(segments) == 0:
+        return None
+    vp = vanishing_point(segments)
+    if vp is None or not (0 <= vp[1] < height * bottom):
+        return None
+
+    left_x = lane_bottom_x(segments, vp, (width, height), 'left')
+    right_x = lane_bottom_x(segments, vp, (width, height), 'right')
+    if left_x is None or right_x is None:
+        return None
+
+    # Points on the line from the vanishing point to the bottom crossing
+    vp_x, vp_y = vp
+    y_bottom = height * bottom
+    y_top = vp_y + top * (y_bottom - vp_y)
+    def x_at(bottom_x, y):
+        return vp_x + (bottom_x - vp_x) * (y - vp_y) / (height - 1 - vp_y)
+    src_points = np.float32([
+        [x_at(left_x, y_top), y_top],          # Top-Left
+        [x_at(right_x, y_top), y_top],         # Top-Right
+        [x_at(right_x, y_bottom), y_bottom],   # Bottom-Right
+        [x_at(left_x, y_bottom), y_bottom]     # Bottom-Left
+    ])
+
+    if check_warp_points(frames[:n_check], src_points) < min_pass:
+        return None
+    return src_points
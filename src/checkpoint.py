@@ -0,0 +1,36 @@
+# src/checkpoint.py
+import json
+import os
+
+def save_checkpoint(path, checkpoint):
+    """
+    Writes a checkpoint (a JSON-friendly dict) atomically: an interruption while writing
+    leaves the previous checkpoint in place.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    """
+    Returns the checkpoint dict, or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def settings_mismatch(checkpoint, settings):
+    """
+    Names of the run settings that differ from the ones the checkpoint was written with.
+    """
+    saved = checkpoint.get('settings', {})
+    return sorted(key for key in set(saved) | set(settings) if saved.get(key) != settings.get(key))
+
+def remove_checkpoint(path):
+    """
+    Removes the checkpoint of a run that completed.
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,77 @@
+# src/config.py
+import json
+
+from preprocess import S_THRESH, L_THRESH, SX_THRESH
+
+class LaneConfig:
+    # Parameters that change the preprocessed (warped) masks; configs that only differ
+    # in the others can share the masks (see sweep.py and mask_cache.py)
+    PREPROCESS_PARAMS = ('s_thresh', 'l_thresh', 'sx_thresh')
+
+    def __init__(self, s_thresh=S_THRESH, l_thresh=L_THRESH, sx_thresh=SX_THRESH,
+                 n_windows=9, margin=100, min_pix=50,
+                 max_curve_diff=0.001, min_lane_width=500, max_lane_width=850,
+                 alpha=0.1, max_frames_lost=15):
+        """
+        Tunable thresholds of the pipeline, by stage:
+        preprocess_image: s_thresh, l_thresh, sx_thresh (inclusive 0-255 ranges of the
+        S channel, L channel and scaled Sobel X)
+        sliding_window_search / search_around_poly: n_windows, margin (px), min_pix
+        sanity_check: max_curve_diff (|A_left - A_right|), min/max_lane_width (px at the bottom row)
+        temporal.Line: alpha (EMA factor), max_frames_lost (frames before TAKE OVER)
+        Pixel values are for full (1280x720) resolution; find_lane_fits scales them.
+        """
+        self.s_thresh = tuple(s_thresh)
+        self.l_thresh = tuple(l_thresh)
+        self.sx_thresh = tuple(sx_thresh)
+        self.n_windows = int(n_windows)
+        self.margin = margin
+        self.min_pix = min_pix
+        self.max_curve_diff = max_curve_diff
+        self.min_lane_width = min_lane_width
+        self.max_lane_width = max_lane_width
+        self.alpha = alpha
+        self.max_frames_lost = int(max_frames_lost)
+
+    def to_dict(self):
+        return {name: list(value) if isinstance(value, tuple) else value
+                for name, value in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Config from a dict of parameters (missing ones keep their defaults).
+        Raises ValueError on an unknown parameter.
+        """
+        unknown = set(values) - set(vars(cls()))
+        if unknown:
+            raise ValueError(f"Unknown config parameter(s): {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+    def replace(self, **changes):
+        """
+        Copy with some parameters changed.
+        """
+        return self.from_dict({**self.to_dict(), **changes})
+
+    def preprocess_settings(self):
+        """
+        The parameters that change the masks, as a JSON-friendly dict (e.g. for a cache key).
+        """
+        return {name: list(getattr(self, name)) for name in self.PREPROCESS_PARAMS}
+
+    def __repr__(self):
+        return f"LaneConfig({', '.join(f'{k}={v!r}' for k, v in vars(self).items())})"
+
+DEFAULT_CONFIG = LaneConfig()
+
+def load_config(path):
+    """
+    Loads a LaneConfig from a JSON file of parameters (e.g. the best_config.json of sweep.py).
+    """
+    with open(path) as f:
+        return LaneConfig.from_dict(json.load(f))
+
+def save_config(path, config):
+    with open(path, 'w') as f:
+        json.dump(config.to_dict(), f, indent=2)
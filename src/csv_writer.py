@@ -2,32 +2,43 @@
 import csv
 
 class CSVWriter:
-    def __init__(self, filepath, headers):
+    def __init__(self, filepath, headers, frame_id=0, resume_offset=None):
         """
         Initializes the CSV writer.
         filepath: path to the output .csv file
         headers: a list of strings for the header row
+        frame_id: frame_id of the first row written
+        resume_offset: continue an existing log instead: it is cut back to this
+        position (from position()) and appended to, without a new header
         """
         self.filepath = filepath
         self.headers = headers
+        self.frame_id = frame_id
         
         try:
-            # Open the file in 'write' mode ('w')
-            self.file = open(self.filepath, 'w', newline='')
-            self.writer = csv.writer(self.file)
-            
-            # Write the header row
-            self.writer.writerow(self.headers)
-            self.frame_id = 0
+            if resume_offset is not None:
+                # Drop the rows written after the position we resume from
+                self.file = open(self.filepath, 'r+', newline='')
+                self.file.truncate(resume_offset)
+                self.file.seek(resume_offset)
+                self.writer = csv.writer(self.file)
+            else:
+                # Open the file in 'write' mode ('w')
+                self.file = open(self.filepath, 'w', newline='')
+                self.writer = csv.writer(self.file)
+                
+                # Write the header row
+                self.writer.writerow(self.headers)
             
         except IOError as e:
             print(f"Error opening CSV file: {e}")
             self.file = None
             self.writer = None
 
-    def write_frame(self, left_line, right_line, lat_offset_m=0.0):
+    def write_frame(self, left_line, right_line, lat_offset_m=0.0, extra=()):
         """
         Writes a new row of data for the current frame.
+        extra: values for any additional columns (after lat_offset_m)
         """
         if self.writer is None:
             return # CSV failed to open
@@ -38,6 +49,16 @@ class CSVWriter:
         left_conf = left_line.confidence
         right_conf = right_line.confidence
         
+        self.write_values(left_detected, right_detected, left_conf, right_conf, lat_offset_m, extra)
+
+    def write_values(self, left_detected, right_detected, left_conf, right_conf, lat_offset_m=0.0,
+                     extra=()):
+        """
+        Writes a row from plain values (e.g. a snapshot taken on another thread).
+        """
+        if self.writer is None:
+            return # CSV failed to open
+            
         # Prepare the row
         row = [
             self.frame_id,
@@ -47,15 +68,27 @@ class CSVWriter:
             f"{right_conf:.2f}",
             f"{lat_offset_m:.2f}"
         ]
+        row.extend(extra)
         
         # Write the row and increment frame counter
         self.writer.writerow(row)
         self.frame_id += 1
 
+    def position(self):
+        """
+        Flushes the file and returns its size, to resume from later (see resume_offset).
+        """
+        if self.file is None:
+            return 0
+        self.file.flush()
+        return self.file.tell()
+
     def close(self):
         """
         Closes the CSV file.
         """
         if self.file is not None:
             self.file.close()
+            self.file = None
+            self.writer = None
             print(f"CSV data saved to: {self.filepath}")
\ No newline at end of file
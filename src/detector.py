@@ -0,0 +1,341 @@
+# src/detector.py
+import cv2
+import numpy as np
+
+from preprocess import preprocess_image, scratch
+from warp import get_warp_roi, roi_warp_matrix, warp_image, PerspectiveWarp, scale_homography
+from lane_fit import find_lane_fits
+from overlay import draw_lane_overlay
+from temporal import Line
+from scheduler import DetectionScheduler
+from profiling import timed
+from metrics import compute_metrics
+from config import DEFAULT_CONFIG
+
+def fit_lanes(warped_binary, left_line, right_line, get_debug=False, scale=1.0, timer=None, config=None):
+    """
+    Fitting part of the pipeline: lane fits on the warped mask and the Line updates.
+    Returns the warped debug image (None unless get_debug).
+    """
+    # 3. Find raw lane fits (searches around the previous fits while tracking)
+    with timed(timer, 'lane_fit'):
+        left_fit_raw, right_fit_raw, warped_debug_img, l_count, r_count = find_lane_fits(
+            warped_binary, left_line, right_line, debug=get_debug, scale=scale, config=config
+        )
+
+    # 4. Update smoothers
+    with timed(timer, 'update'):
+        left_line.update(left_fit_raw, l_count)
+        right_line.update(right_fit_raw, r_count)
+
+    if timer is not None:
+        timer.counts['left_pixels'] = l_count
+        timer.counts['right_pixels'] = r_count
+
+    return warped_debug_img
+
+def warp_mask(frame, M, get_debug=False, preprocess_mode='full', roi=None, warper=None, scale=1.0,
+              timer=None, buffers=None, config=None):
+    """
+    Preprocessing part of the pipeline: the 0/1 lane mask, warped into the bird's-eye view.
+    See process_frame for the arguments.
+    Returns the binary mask (full frame if get_debug) and the warped mask.
+    """
+    img_height, img_width = frame.shape[:2]
+
+    with timed(timer, 'preprocess'):
+        proc_frame, proc_M = frame, M
+        if scale != 1.0:
+            proc_size = (int(round(img_width * scale)), int(round(img_height * scale)))
+            proc_frame = cv2.resize(frame, proc_size, interpolation=cv2.INTER_AREA,
+                                    dst=scratch(buffers, 'resized', (proc_size[1], proc_size[0], 3)))
+            proc_M = scale_homography(M, scale)
+        proc_height, proc_width = proc_frame.shape[:2]
+        proc_size = (proc_width, proc_height)
+
+    if preprocess_mode == 'warped':
+        # 1+2. Perspective Transform, then Preprocessing in warped space
+        with timed(timer, 'warp'):
+            if warper is not None:
+                warped_color = warper.warp(proc_frame, cv2.INTER_LINEAR,
+                                           out=scratch(buffers, 'warped_color', proc_frame.shape))
+            else:
+                warped_color = warp_image(proc_frame, proc_M)
+        with timed(timer, 'preprocess'):
+            binary_mask = preprocess_image(warped_color, buffers=buffers, config=config)
+        warped_binary = binary_mask
+    elif preprocess_mode == 'roi' and roi is not None:
+        # 1. Preprocessing (only the part of the frame that ends up in the warped view)
+        x0, y0, x1, y1 = roi
+        with timed(timer, 'preprocess'):
+            binary_mask = preprocess_image(proc_frame[y0:y1, x0:x1], buffers=buffers, config=config)
+
+        # 2. Perspective Transform (straight from the cropped mask)
+        with timed(timer, 'warp'):
+            if warper is not None:
+                warped_binary = warper.warp(binary_mask, roi=roi,
+                                            out=scratch(buffers, 'warped_binary', (proc_height, proc_width)))
+            else:
+                warped_binary = warp_image(binary_mask, roi_warp_matrix(proc_M, roi), proc_size)
+
+        if get_debug:
+            full_mask = np.zeros((proc_height, proc_width), dtype=np.uint8)
+            full_mask[y0:y1, x0:x1] = binary_mask
+            binary_mask = full_mask
+    else:
+        # 1. Preprocessing
+        with timed(timer, 'preprocess'):
+            binary_mask = preprocess_image(proc_frame, buffers=buffers, config=config)
+
+        # 2. Perspective Transform
+        with timed(timer, 'warp'):
+            if warper is not None:
+                # 0/1 mask, nearest-neighbour is enough
+                warped_binary = warper.warp(binary_mask,
+                                            out=scratch(buffers, 'warped_binary', (proc_height, proc_width)))
+            else:
+                warped_binary = warp_image(binary_mask, proc_M)
+
+    return binary_mask, warped_binary
+
+def detect_lanes(frame, M, left_line, right_line, get_debug=False, preprocess_mode='full', roi=None,
+                 warper=None, scale=1.0, timer=None, buffers=None, mask_cache=None, config=None):
+    """
+    Detection part of the pipeline: preprocess, warp, fit and update the Line smoothers.
+    See process_frame for the arguments.
+    Returns the binary mask and the warped debug image (None unless get_debug).
+    """
+    # 1+2. Lane mask in the bird's-eye view
+    binary_mask, warped_binary = warp_mask(
+        frame, M, get_debug, preprocess_mode, roi, warper, scale, timer, buffers, config
+    )
+
+    if mask_cache is not None:
+        mask_cache.append(warped_binary)
+
+    # 3+4. Fit and smooth
+    warped_debug_img = fit_lanes(warped_binary, left_line, right_line, get_debug, scale, timer, config)
+
+    return binary_mask, warped_debug_img
+
+def lane_metrics(left_line, right_line, img_size, xm_per_pix, ym_per_pix):
+    """
+    Lateral offset and average curvature radius (meters) of the current Line state,
+    both 0.0 unless both lines are detected.
+    """
+    lat_offset_m = 0.0
+    avg_curve_rad_m = 0.0
+
+    if left_line.detected and right_line.detected:
+        # Closed form, at the bottom of the image (same as a whole run's fits at once)
+        offset, left_curve, right_curve = compute_metrics(left_line.current_fit, right_line.current_fit,
+                                                          img_size, xm_per_pix, ym_per_pix)
+        lat_offset_m = float(offset)
+        avg_curve_rad_m = float(left_curve + right_curve) / 2
+
+    return lat_offset_m, avg_curve_rad_m
+
+def process_frame(frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, get_debug=False,
+                  render=True, preprocess_mode='full', roi=None, warper=None, scale=1.0, measure=True,
+                  timer=None, buffers=None, mask_cache=None, config=None):
+    """
+    Runs the full pipeline on one frame.
+    If render is False, the overlay is skipped and final_overlay is None (metrics only).
+    preprocess_mode: 'full' (threshold the whole frame), 'roi' (only the roi box that
+    maps into the bird's-eye view, see warp.get_warp_roi) or 'warped' (warp the colour
+    frame first and threshold in warped space).
+    warper: optional warp.PerspectiveWarp with precomputed remap tables for M/Minv.
+    scale: processing resolution relative to the frame (e.g. 0.5). Preprocessing, warping
+    and fitting run on the resized frame, so roi and warper must be built for that
+    resolution; M/Minv, the Line fits, metrics and overlay stay at full resolution.
+    measure: if False, detection (steps 1-4) is skipped and the current Line state is
+    reused for metrics and overlay (see scheduler.DetectionScheduler).
+    timer: optional profiling.StageTimer that records per-stage times and pixel counts.
+    buffers: optional dict of scratch images reused across frames. The returned overlay
+    (and mask) then live in these buffers and are overwritten by the next call.
+    mask_cache: optional mask_cache.MaskCacheWriter that records the warped mask.
+    config: optional config.LaneConfig with the preprocessing and lane search thresholds
+    (the Line smoothing parameters are set on the Lines themselves).
+    """
+    img_height, img_width = frame.shape[:2]
+
+    binary_mask, warped_debug_img = None, None
+    if measure:
+        binary_mask, warped_debug_img = detect_lanes(
+            frame, M, left_line, right_line, get_debug, preprocess_mode, roi, warper, scale, timer, buffers,
+            mask_cache, config
+        )
+
+    # 5. Calculate Metrics
+    with timed(timer, 'metrics'):
+        lat_offset_m, avg_curve_rad_m = lane_metrics(
+            left_line, right_line, (img_width, img_height), xm_per_pix, ym_per_pix
+        )
+
+    # 6. Draw final overlay
+    final_overlay = None
+    if render:
+        with timed(timer, 'overlay'):
+            canvas = scratch(buffers, 'overlay', frame.shape)
+            if canvas is None:
+                canvas = frame.copy()
+            else:
+                np.copyto(canvas, frame)
+            final_overlay = draw_lane_overlay(canvas, Minv, left_line, right_line,
+                lat_offset_m, avg_curve_rad_m)
+
+    if get_debug:
+        debug_images = {
+            'original': frame.copy(),
+            'binary': binary_mask,
+            'warped': warped_debug_img,
+            'final': final_overlay
+        }
+        return final_overlay, debug_images, left_line, right_line, lat_offset_m
+
+    return final_overlay, None, left_line, right_line, lat_offset_m
+
+def render_overlay(frame, Minv, left_line, right_line, xm_per_pix, ym_per_pix):
+    """
+    Overlay for a frame that was processed with render=False (on a copy of the frame).
+    """
+    img_height, img_width = frame.shape[:2]
+    lat_offset_m, avg_curve_rad_m = lane_metrics(
+        left_line, right_line, (img_width, img_height), xm_per_pix, ym_per_pix
+    )
+    return draw_lane_overlay(frame.copy(), Minv, left_line, right_line, lat_offset_m, avg_curve_rad_m)
+
+def collage_images(frame, M, preprocess_mode='full', roi=None, warper=None, scale=1.0, config=None):
+    """
+    What a fresh (blind) detection sees in this frame, for a debug collage:
+    {'original', 'binary', 'warped'}. Uses throwaway Lines, so tracking is not affected.
+    """
+    binary_mask, warped_debug_img = detect_lanes(
+        frame, M, Line(), Line(), True, preprocess_mode, roi, warper, scale, config=config
+    )
+    return {'original': frame, 'binary': binary_mask, 'warped': warped_debug_img}
+
+
+class LaneResult:
+    """
+    Per-frame result of LaneDetector.process.
+    """
+    __slots__ = ('frame_id', 'left_detected', 'right_detected', 'left_conf', 'right_conf', 'lat_offset_m',
+                 'curve_rad_m', 'left_fit', 'right_fit', 'measured', 'overlay')
+
+    def __init__(self, frame_id, left_line, right_line, lat_offset_m, curve_rad_m, measured, overlay):
+        self.frame_id = frame_id
+        self.left_detected = left_line.detected
+        self.right_detected = right_line.detected
+        self.left_conf = float(left_line.confidence)
+        self.right_conf = float(right_line.confidence)
+        self.lat_offset_m = lat_offset_m
+        self.curve_rad_m = curve_rad_m
+        # The Line replaces (never modifies) its fit arrays, so these stay valid
+        self.left_fit = left_line.current_fit
+        self.right_fit = right_line.current_fit
+        self.measured = measured
+        self.overlay = overlay
+
+
+class LaneDetector:
+    def __init__(self, calibration, preprocess_mode='full', scale=1.0, render=True, detect_every=1,
+                 extrapolate=False, config=None):
+        """
+        Stateful lane detection for one camera, for embedding the pipeline in other code.
+        calibration: a profile from calibration.make_calibration / load_calibration
+        render: draw the overlay (LaneResult.overlay), otherwise metrics only
+        detect_every, extrapolate: adaptive detection cadence (see scheduler.DetectionScheduler)
+        config: config.LaneConfig with the pipeline thresholds and the smoothing (alpha), e.g.
+        DEFAULT_CONFIG.replace(alpha=0.2) (default: DEFAULT_CONFIG)
+        See process_frame for preprocess_mode and scale.
+        The scratch images for every stage are allocated on the first frame and reused,
+        so the overlay in a LaneResult is only valid until the next process() call.
+        """
+        self.M, self.Minv = calibration['M'], calibration['Minv']
+        self.xm_per_pix, self.ym_per_pix = calibration['xm_per_pix'], calibration['ym_per_pix']
+        self.img_size = tuple(calibration['img_size'])
+        self.render = render
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.scheduler_args = None
+        if detect_every > 1:
+            self.scheduler_args = {'interval': detect_every, 'extrapolate': extrapolate}
+
+        # Calibration at the processing resolution
+        proc_M, proc_Minv, proc_size = self.M, self.Minv, self.img_size
+        if scale != 1.0:
+            proc_M = scale_homography(self.M, scale)
+            proc_Minv = scale_homography(self.Minv, scale)
+            proc_size = (int(round(self.img_size[0] * scale)), int(round(self.img_size[1] * scale)))
+        roi = get_warp_roi(proc_size, proc_Minv) if preprocess_mode == 'roi' else None
+        warper = PerspectiveWarp(proc_M, proc_Minv, proc_size)
+        self.frame_kwargs = {'preprocess_mode': preprocess_mode, 'roi': roi, 'warper': warper, 'scale': scale,
+                             'config': self.config}
+
+        self.buffers = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the tracked lines (e.g. on a scene cut or a new clip); keeps the buffers.
+        """
+        self.left_line = Line(alpha=self.config.alpha, max_frames_lost=self.config.max_frames_lost)
+        self.right_line = Line(alpha=self.config.alpha, max_frames_lost=self.config.max_frames_lost)
+        self.scheduler = DetectionScheduler(**self.scheduler_args) if self.scheduler_args else None
+        self.frame_id = 0
+
+    def process(self, frame, timer=None):
+        """
+        Runs the pipeline on the next frame (BGR, img_size of the calibration).
+        Returns a LaneResult.
+        """
+        measure = True
+        if self.scheduler is not None:
+            measure = self.scheduler.should_measure(self.left_line, self.right_line)
+            if not measure:
+                self.scheduler.predict(self.left_line, self.right_line)
+
+        if measure:
+            detect_lanes(frame, self.M, self.left_line, self.right_line, timer=timer, buffers=self.buffers,
+                         **self.frame_kwargs)
+        with timed(timer, 'metrics'):
+            lat_offset_m, curve_rad_m = lane_metrics(
+                self.left_line, self.right_line, self.img_size, self.xm_per_pix, self.ym_per_pix
+            )
+
+        overlay = None
+        if self.render:
+            with timed(timer, 'overlay'):
+                overlay = scratch(self.buffers, 'overlay', frame.shape)
+                np.copyto(overlay, frame)
+                draw_lane_overlay(overlay, self.Minv, self.left_line, self.right_line, lat_offset_m, curve_rad_m)
+
+        if self.scheduler is not None:
+            self.scheduler.update(measure, self.left_line, self.right_line)
+
+        result = LaneResult(self.frame_id, self.left_line, self.right_line, lat_offset_m, curve_rad_m,
+                            measure, overlay)
+        self.frame_id += 1
+        return result
+
+    def warped_mask(self, frame):
+        """
+        Only the preprocessing and warp of a frame (no fitting, the tracked lines are untouched).
+        Returns the 0/1 mask in the bird's-eye view, valid until the next call.
+        """
+        return warp_mask(frame, self.M, buffers=self.buffers, **self.frame_kwargs)[1]
+
+    def stream(self, source):
+        """
+        Generator of LaneResults over a frame source: a cv2.VideoCapture (read until it
+        runs out) or any iterable of frames.
+        """
+        if hasattr(source, 'read'):
+            while True:
+                ret, frame = source.read()
+                if not ret:
+                    return
+                yield self.process(frame)
+        else:
+            for frame in source:
+                yield self.process(frame)
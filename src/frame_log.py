@@ -0,0 +1,223 @@
+# src/frame_log.py
+import sys
+
+import numpy as np
+
+from csv_writer import CSVWriter
+from metrics import curvature_radius_m
+
+# Fixed per-frame fields (full precision); extra columns are appended as float64
+BASE_FIELDS = [
+    ('frame_id', np.int32),
+    ('left_detected', np.uint8),
+    ('right_detected', np.uint8),
+    ('left_conf', np.float64),
+    ('right_conf', np.float64),
+    ('lat_offset_m', np.float64),
+    ('curve_rad_m', np.float64),
+    ('left_fit', np.float64, (3,)),
+    ('right_fit', np.float64, (3,)),
+    ('left_pixel_count', np.int32),
+    ('right_pixel_count', np.int32),
+]
+
+# The columns CSVWriter always writes, in order
+CSV_FIELDS = ['frame_id', 'left_detected', 'right_detected', 'left_conf', 'right_conf', 'lat_offset_m']
+
+_BASE_NAMES = [field[0] for field in BASE_FIELDS]
+
+# Space reserved for the .npy header, so it can be rewritten in place with the final row count
+_HEADER_LEN = 1024
+
+def log_dtype(extra_headers=()):
+    return np.dtype(BASE_FIELDS + [(name, np.float64) for name in extra_headers])
+
+def frame_details(left_line, right_line, img_height, xm_per_pix, ym_per_pix):
+    """
+    Snapshot of the fits, pixel counts and average curvature (as in process_frame) of the
+    current Line state, as keyword arguments for FrameLogWriter.write_values.
+    """
+    curve_rad_m = 0.0
+    if left_line.detected and right_line.detected:
+        left_curve = curvature_radius_m(left_line.current_fit, img_height - 1, xm_per_pix, ym_per_pix)
+        right_curve = curvature_radius_m(right_line.current_fit, img_height - 1, xm_per_pix, ym_per_pix)
+        curve_rad_m = float(left_curve + right_curve) / 2
+    return {'left_fit': left_line.current_fit, 'right_fit': right_line.current_fit, 'curve_rad_m': curve_rad_m,
+            'left_pixel_count': left_line.pixel_count, 'right_pixel_count': right_line.pixel_count}
+
+def frame_row(left_line, right_line, lat_offset_m, measured=None, timer=None, detail_args=None):
+    """
+    Log values of one frame, from the Line state right after the frame was processed:
+    (csv_values, details) for write_values(*csv_values, **details).
+    measured: whether detection ran (the 'measured' column of scheduled runs), None = no such column
+    timer: optional profiling.StageTimer, its values become the next extra columns
+    detail_args: (img_height, xm_per_pix, ym_per_pix) to include frame_details (.npy logs), else {}
+    """
+    extra = () if measured is None else (int(measured),)
+    if timer is not None:
+        extra += timer.csv_values()
+    csv_values = (int(left_line.detected), int(right_line.detected), left_line.confidence, right_line.confidence,
+                  lat_offset_m, extra)
+    details = frame_details(left_line, right_line, *detail_args) if detail_args is not None else {}
+    return csv_values, details
+
+def npy_header(dtype, shape):
+    """
+    .npy (version 1.0) header for a C-order array, padded to a fixed _HEADER_LEN bytes so it
+    can be rewritten in place once the final shape is known (streamed writers).
+    """
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                   'shape': tuple(shape)})
+    # magic (6) + version (2) + header length (2) + header + padding + '\n'
+    pad = _HEADER_LEN - 10 - len(header) - 1
+    if pad < 0:
+        raise ValueError("Too many columns for the reserved .npy header")
+    header_len = _HEADER_LEN - 10
+    return (np.lib.format.MAGIC_PREFIX + bytes([1, 0]) + header_len.to_bytes(2, 'little')
+            + (header + ' ' * pad + '\n').encode('latin1'))
+
+class FrameLogWriter:
+    def __init__(self, filepath, headers, chunk_size=1024, frame_id=0, resume_offset=None):
+        """
+        Columnar binary alternative to CSVWriter: a .npy file of one record per frame.
+        filepath: path to the output .npy file
+        headers: the CSV header list; columns after the CSV_FIELDS become float64 extra fields
+        chunk_size: rows buffered in memory before they are flushed to disk
+        frame_id, resume_offset: as for CSVWriter
+        Load the result with load_frame_log (memory-mapped), or convert it with frame_log_to_csv.
+        """
+        self.filepath = filepath
+        self.extra_headers = [h for h in headers if h not in CSV_FIELDS]
+        self.dtype = log_dtype(self.extra_headers)
+
+        # Preallocated chunk buffer, reused after every flush
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self.n_buffered = 0
+        self.frame_id = frame_id
+        self.n_rows = 0
+
+        try:
+            if resume_offset is not None:
+                # Drop the records written after the position we resume from
+                self.file = open(self.filepath, 'r+b')
+                self.file.truncate(resume_offset)
+                self.file.seek(resume_offset)
+                self.n_rows = (resume_offset - _HEADER_LEN) // self.dtype.itemsize
+            else:
+                self.file = open(self.filepath, 'wb')
+                self.file.write(npy_header(self.dtype, (0,)))
+        except IOError as e:
+            print(f"Error opening frame log: {e}")
+            self.file = None
+
+    def write_frame(self, left_line, right_line, lat_offset_m=0.0, extra=(), curve_rad_m=0.0):
+        """
+        Writes a new record for the current frame from the Line objects.
+        """
+        self.write_values(int(left_line.detected), int(right_line.detected), left_line.confidence,
+                          right_line.confidence, lat_offset_m, extra, left_fit=left_line.current_fit,
+                          right_fit=right_line.current_fit, curve_rad_m=curve_rad_m,
+                          left_pixel_count=left_line.pixel_count, right_pixel_count=right_line.pixel_count)
+
+    def write_values(self, left_detected, right_detected, left_conf, right_conf, lat_offset_m=0.0,
+                     extra=(), left_fit=None, right_fit=None, curve_rad_m=0.0, left_pixel_count=0,
+                     right_pixel_count=0):
+        """
+        Writes a record from plain values (same order as CSVWriter.write_values).
+        Missing fits are stored as NaN.
+        """
+        if self.file is None:
+            return # Log failed to open
+
+        row = self.buffer[self.n_buffered]
+        row['frame_id'] = self.frame_id
+        row['left_detected'] = left_detected
+        row['right_detected'] = right_detected
+        row['left_conf'] = left_conf
+        row['right_conf'] = right_conf
+        row['lat_offset_m'] = lat_offset_m
+        row['curve_rad_m'] = curve_rad_m
+        row['left_fit'] = left_fit if left_fit is not None else np.nan
+        row['right_fit'] = right_fit if right_fit is not None else np.nan
+        row['left_pixel_count'] = left_pixel_count
+        row['right_pixel_count'] = right_pixel_count
+        for name, value in zip(self.extra_headers, extra):
+            row[name] = value
+
+        self.n_buffered += 1
+        self.n_rows += 1
+        self.frame_id += 1
+        if self.n_buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the buffered records to the file.
+        """
+        if self.file is None or self.n_buffered == 0:
+            return
+        self.file.write(self.buffer[:self.n_buffered].tobytes())
+        self.n_buffered = 0
+
+    def position(self):
+        """
+        Flushes the records and returns the file size, to resume from later (see resume_offset).
+        """
+        if self.file is None:
+            return 0
+        self.flush()
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        """
+        Flushes the last chunk and writes the final row count into the header.
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.seek(0)
+            self.file.write(npy_header(self.dtype, (self.n_rows,)))
+            self.file.close()
+            self.file = None
+            print(f"Frame log saved to: {self.filepath}")
+
+def load_frame_log(filepath, mmap=True):
+    """
+    Loads a frame log as a structured array (memory-mapped read-only by default, no parsing).
+    e.g. log['lat_offset_m'], log['left_fit'][:, 0]
+    """
+    return np.load(filepath, mmap_mode='r' if mmap else None)
+
+def _format_extra(value):
+    value = float(value)
+    if value.is_integer():
+        return int(value)
+    return f"{value:.6g}"
+
+def frame_log_to_csv(filepath, csv_path=None):
+    """
+    Converts a frame log into the per-frame CSV that CSVWriter produces (same columns, 2 decimals).
+    Returns the path of the CSV.
+    """
+    log = load_frame_log(filepath)
+    if csv_path is None:
+        csv_path = str(filepath).rsplit('.', 1)[0] + '.csv'
+
+    extra_headers = [name for name in log.dtype.names if name not in _BASE_NAMES]
+    csv_log = CSVWriter(str(csv_path), CSV_FIELDS + extra_headers)
+    for row in log:
+        extra = tuple(_format_extra(row[name]) for name in extra_headers)
+        # Keep the stored ids (partial and resumed runs do not start at 0)
+        csv_log.frame_id = int(row['frame_id'])
+        csv_log.write_values(int(row['left_detected']), int(row['right_detected']), float(row['left_conf']),
+                             float(row['right_conf']), float(row['lat_offset_m']), extra)
+    csv_log.close()
+    return csv_path
+
+
+if __name__ == '__main__':
+    # python src/frame_log.py <log.npy> [out.csv]
+    if len(sys.argv) < 2:
+        print("Usage: python src/frame_log.py <log.npy> [out.csv]")
+        sys.exit(1)
+    frame_log_to_csv(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
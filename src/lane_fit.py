@@ -2,6 +2,8 @@
 import numpy as np
 import cv2
 
+from config import DEFAULT_CONFIG
+
 def histogram(image):
     # Get the bottom half of the image
     bottom_half = image[image.shape[0]//2:,:]
@@ -14,30 +16,42 @@ def histogram(image):
     
     return left_x_base, right_x_base
 
-def sliding_window_search(binary_warped, left_x_base, right_x_base):
-    # Create an output image to draw on
-    out_img = np.dstack((binary_warped, binary_warped, binary_warped)) * 255
-
-    n_windows = 9
-    margin = 100
-    min_pix = 50
+def sliding_window_search(binary_warped, left_x_base, right_x_base, debug=False,
+                          n_windows=9, margin=100, min_pix=50, moments=None):
+    """
+    Sliding windows up from the histogram peaks, re-centred on the pixels found.
+    moments: optional (left, right) FitMoments, the pixels of each window are added to them
+    as they are found (solve() then gives the fits without another pass over the pixels).
+    """
+    # Create an output image to draw on (only when debugging)
+    out_img = None
+    if debug:
+        out_img = np.dstack((binary_warped, binary_warped, binary_warped)) * 255
 
-    window_height = int(binary_warped.shape[0] // n_windows)
+    height = binary_warped.shape[0]
+    window_height = int(height // n_windows)
 
     # Find the x and y coordinates of all white pixels
-    nonzero = binary_warped.nonzero()
-    nonzeroy = np.array(nonzero[0])
-    nonzerox = np.array(nonzero[1])
+    # nonzero() is row-major, so nonzeroy is sorted and each window's
+    # y-range is a contiguous slice of the arrays
+    nonzeroy, nonzerox = binary_warped.nonzero()
+    win_bounds = height - np.arange(n_windows + 1) * window_height
+    win_starts = np.searchsorted(nonzeroy, win_bounds, side='left')
 
     left_x_current = left_x_base
     right_x_current = right_x_base
 
-    left_lane_inds = []
-    right_lane_inds = []
+    # Found pixels are written straight into these (no index lists to concatenate)
+    leftx = np.empty(len(nonzerox), dtype=nonzerox.dtype)
+    lefty = np.empty(len(nonzeroy), dtype=nonzeroy.dtype)
+    rightx = np.empty(len(nonzerox), dtype=nonzerox.dtype)
+    righty = np.empty(len(nonzeroy), dtype=nonzeroy.dtype)
+    n_left = 0
+    n_right = 0
 
     for window in range(n_windows):
-        win_y_low = binary_warped.shape[0] - (window + 1) * window_height
-        win_y_high = binary_warped.shape[0] - window * window_height
+        win_y_low = win_bounds[window + 1]
+        win_y_high = win_bounds[window]
         
         win_xleft_low = left_x_current - margin
         win_xleft_high = left_x_current + margin
@@ -45,56 +59,214 @@ def sliding_window_search(binary_warped, left_x_base, right_x_base):
         win_xright_high = right_x_current + margin
 
         # Draw the windows (for debugging)
-        cv2.rectangle(out_img, (win_xleft_low, win_y_low), (win_xleft_high, win_y_high), (0, 255, 0), 2)
-        cv2.rectangle(out_img, (win_xright_low, win_y_low), (win_xright_high, win_y_high), (0, 255, 0), 2)
+        if debug:
+            cv2.rectangle(out_img, (win_xleft_low, int(win_y_low)), (win_xleft_high, int(win_y_high)), (0, 255, 0), 2)
+            cv2.rectangle(out_img, (win_xright_low, int(win_y_low)), (win_xright_high, int(win_y_high)), (0, 255, 0), 2)
 
-        good_left_inds = ((nonzeroy >= win_y_low) & (nonzeroy < win_y_high) &
-                          (nonzerox >= win_xleft_low) & (nonzerox < win_xleft_high)).nonzero()[0]
-        
-        good_right_inds = ((nonzeroy >= win_y_low) & (nonzeroy < win_y_high) &
-                           (nonzerox >= win_xright_low) & (nonzerox < win_xright_high)).nonzero()[0]
+        # Pixels in this window's rows
+        row_slice = slice(win_starts[window + 1], win_starts[window])
+        win_x = nonzerox[row_slice]
+        win_y = nonzeroy[row_slice]
 
-        left_lane_inds.append(good_left_inds)
-        right_lane_inds.append(good_right_inds)
+        good_left = (win_x >= win_xleft_low) & (win_x < win_xleft_high)
+        good_right = (win_x >= win_xright_low) & (win_x < win_xright_high)
+        good_leftx = win_x[good_left]
+        good_rightx = win_x[good_right]
 
-        if len(good_left_inds) > min_pix:
-            left_x_current = int(np.mean(nonzerox[good_left_inds]))
-        if len(good_right_inds) > min_pix:
-            right_x_current = int(np.mean(nonzerox[good_right_inds]))
+        leftx[n_left:n_left + len(good_leftx)] = good_leftx
+        lefty[n_left:n_left + len(good_leftx)] = win_y[good_left]
+        n_left += len(good_leftx)
+        rightx[n_right:n_right + len(good_rightx)] = good_rightx
+        righty[n_right:n_right + len(good_rightx)] = win_y[good_right]
+        n_right += len(good_rightx)
+        if moments is not None:
+            moments[0].add(good_leftx, win_y[good_left])
+            moments[1].add(good_rightx, win_y[good_right])
 
-    try:
-        left_lane_inds = np.concatenate(left_lane_inds)
-        right_lane_inds = np.concatenate(right_lane_inds)
-    except ValueError:
-        pass # Handle empty arrays
+        if len(good_leftx) > min_pix:
+            left_x_current = int(np.mean(good_leftx))
+        if len(good_rightx) > min_pix:
+            right_x_current = int(np.mean(good_rightx))
+
+    leftx = leftx[:n_left]
+    lefty = lefty[:n_left]
+    rightx = rightx[:n_right]
+    righty = righty[:n_right]
+    
+    # Color the found pixels
+    if debug:
+        out_img[lefty, leftx] = [255, 0, 0] # Red
+        out_img[righty, rightx] = [0, 0, 255] # Blue
+
+    return leftx, lefty, rightx, righty, out_img # Return debug image (None unless debug)
+
+def search_around_poly(binary_warped, left_fit, right_fit, margin=100, debug=False):
+    """
+    Targeted search: collects pixels within +/- margin of the previous fits
+    instead of running the histogram + sliding windows.
+    """
+    # Create an output image to draw on (only when debugging)
+    out_img = None
+    if debug:
+        out_img = np.dstack((binary_warped, binary_warped, binary_warped)) * 255
+
+    # Find the x and y coordinates of all white pixels
+    nonzero = binary_warped.nonzero()
+    nonzeroy = np.array(nonzero[0])
+    nonzerox = np.array(nonzero[1])
+
+    # x-position of each previous fit at every nonzero pixel's row
+    left_fitx = left_fit[0]*nonzeroy**2 + left_fit[1]*nonzeroy + left_fit[2]
+    right_fitx = right_fit[0]*nonzeroy**2 + right_fit[1]*nonzeroy + right_fit[2]
+
+    left_lane_inds = ((nonzerox > left_fitx - margin) & (nonzerox < left_fitx + margin))
+    right_lane_inds = ((nonzerox > right_fitx - margin) & (nonzerox < right_fitx + margin))
 
     leftx = nonzerox[left_lane_inds]
     lefty = nonzeroy[left_lane_inds]
     rightx = nonzerox[right_lane_inds]
     righty = nonzeroy[right_lane_inds]
-    
+
     # Color the found pixels
-    out_img[lefty, leftx] = [255, 0, 0] # Red
-    out_img[righty, rightx] = [0, 0, 255] # Blue
+    if debug:
+        out_img[lefty, leftx] = [255, 0, 0] # Red
+        out_img[righty, rightx] = [0, 0, 255] # Blue
 
-    return leftx, lefty, rightx, righty, out_img # Return debug image
+    return leftx, lefty, rightx, righty, out_img # Return debug image (None unless debug)
 
-def fit_polynomial(leftx, lefty, rightx, righty):
-    try:
-        left_fit = np.polyfit(lefty, leftx, 2)
-    except (np.linalg.LinAlgError, TypeError, ValueError):
-        left_fit = None 
+def power_sums(x, y, y_center=0.0, y_scale=1.0, weights=None):
+    """
+    Moments for a quadratic least-squares fit x = f(y), with t = (y - y_center) / y_scale:
+    S[k] = sum(w * t^k) for k = 0..4 and T[k] = sum(w * x * t^k) for k = 0..2.
+    Sums over disjoint pixel sets (e.g. search windows) can simply be added up.
+    """
+    t = (np.asarray(y, dtype=np.float64) - y_center) / y_scale
+    x = np.asarray(x, dtype=np.float64)
+    t2 = t * t
+    if weights is None:
+        S = np.array([len(t), t.sum(), t2.sum(), np.dot(t2, t), np.dot(t2, t2)])
+        T = np.array([x.sum(), np.dot(x, t), np.dot(x, t2)])
+    else:
+        w = np.asarray(weights, dtype=np.float64)
+        wt2 = w * t2
+        S = np.array([w.sum(), np.dot(w, t), wt2.sum(), np.dot(wt2, t), np.dot(wt2, t2)])
+        T = np.array([np.dot(w, x), np.dot(w * t, x), np.dot(wt2, x)])
+    return S, T
 
+def solve_quadratic(S, T, y_center=0.0, y_scale=1.0, max_cond=1e10):
+    """
+    Solves the 3x3 normal equations built from power_sums().
+    Returns the coefficients [A, B, C] of x = A*y^2 + B*y + C in pixel units,
+    or None for degenerate input (too few pixels / rows to define a parabola).
+    """
+    N = np.array([[S[4], S[3], S[2]],
+                  [S[3], S[2], S[1]],
+                  [S[2], S[1], S[0]]])
+    if S[0] <= 0 or np.linalg.cond(N) > max_cond:
+        return None
     try:
-        right_fit = np.polyfit(righty, rightx, 2)
-    except (np.linalg.LinAlgError, TypeError, ValueError):
-        right_fit = None
+        a, b, c = np.linalg.solve(N, T[::-1])
+    except np.linalg.LinAlgError:
+        return None
+    
+    # Undo the normalisation t = (y - m) / s
+    m, s = y_center, y_scale
+    A = a / s**2
+    B = b / s - 2 * a * m / s**2
+    C = c - b * m / s + a * m**2 / s**2
+    return np.array([A, B, C])
+
+def fit_quadratic(x, y, weights=None):
+    """
+    Least-squares x = A*y^2 + B*y + C from accumulated moments (same result as
+    np.polyfit(y, x, 2), without the Vandermonde matrix / SVD).
+    weights: optional per-pixel weights on the squared residuals
+    (np.polyfit's w corresponds to sqrt(weights)).
+    Returns [A, B, C] or None for degenerate input.
+    """
+    if len(y) < 3:
+        return None
+    # Normalise y to [-1, 1] so the y^4 sums stay well conditioned
+    y_min, y_max = np.min(y), np.max(y)
+    y_center = (y_max + y_min) / 2
+    y_scale = max((y_max - y_min) / 2, 1.0)
+    
+    S, T = power_sums(x, y, y_center, y_scale, weights)
+    return solve_quadratic(S, T, y_center, y_scale)
+
+def near_weights(y, img_height, strength=1.0):
+    """
+    Pixel weights growing linearly towards the bottom of the image (near the car):
+    1 at the top row, 1 + strength at the bottom row.
+    """
+    return 1.0 + strength * np.asarray(y, dtype=np.float64) / max(img_height - 1, 1)
+
+class FitMoments:
+    def __init__(self, img_height, near_weight=0.0):
+        """
+        Running power sums of one line's pixels, added a pixel set (e.g. a search window) at a time.
+        y is normalised over the whole image height instead of the pixels' own range (as in
+        fit_quadratic) so that every set shares the normalisation and the sums can be added up.
+        near_weight > 0 weights pixels near the car more, see near_weights().
+        """
+        self.img_height = img_height
+        self.near_weight = near_weight
+        self.y_center = (img_height - 1) / 2
+        self.y_scale = max((img_height - 1) / 2, 1.0)
+        self.count = 0
+        self.S = np.zeros(5)
+        self.T = np.zeros(3)
+
+    def add(self, x, y):
+        if len(y) == 0:
+            return
+        weights = None
+        if self.near_weight > 0:
+            weights = near_weights(y, self.img_height, self.near_weight)
+        S, T = power_sums(x, y, self.y_center, self.y_scale, weights)
+        self.S += S
+        self.T += T
+        self.count += len(y)
+
+    def solve(self):
+        """
+        [A, B, C] of the pixels added so far, or None for degenerate input.
+        """
+        if self.count < 3:
+            return None
+        return solve_quadratic(self.S, self.T, self.y_center, self.y_scale)
+
+def fit_polynomial(leftx, lefty, rightx, righty, img_height=None, near_weight=0.0):
+    """
+    Fits x = A*y^2 + B*y + C to each line's pixels.
+    near_weight > 0 weights pixels near the car more (needs img_height), see near_weights().
+    A fit is None if there are not enough distinct pixels.
+    """
+    left_weights, right_weights = None, None
+    if near_weight > 0 and img_height is not None:
+        left_weights = near_weights(lefty, img_height, near_weight)
+        right_weights = near_weights(righty, img_height, near_weight)
+    
+    left_fit = fit_quadratic(leftx, lefty, left_weights)
+    right_fit = fit_quadratic(rightx, righty, right_weights)
 
     return left_fit, right_fit
 
-def sanity_check(left_fit, right_fit, img_height):
+def scale_fit(fit, scale):
+    """
+    Converts a fit to an image resized by 'scale': x' = s*x, y' = s*y
+    gives x' = (A/s)*y'^2 + B*y' + s*C.
+    """
+    if fit is None:
+        return None
+    return np.array([fit[0] / scale, fit[1], fit[2] * scale])
+
+def sanity_check(left_fit, right_fit, img_height, scale=1.0, max_curve_diff=0.001, min_lane_width=500,
+                 max_lane_width=850):
     """
     Checks if the detected lines are plausible.
+    scale: resolution relative to the 1280x720 the thresholds are tuned for.
+    max_curve_diff, min/max_lane_width: bounds at full resolution (see config.LaneConfig).
     Returns (left_fit, right_fit) which may be None if checks fail.
     """
     # Check 0: Did the polynomial fit succeed?
@@ -104,7 +276,7 @@ def sanity_check(left_fit, right_fit, img_height):
     # Check 1: Are lines roughly parallel?
     # Compare their curvature (the 'A' coefficient)
     curve_diff = abs(left_fit[0] - right_fit[0])
-    if curve_diff > 0.001: # Threshold
+    if curve_diff > max_curve_diff / scale: # Threshold
         return None, None # Not parallel, FAIL and return
         
     # Check 2: Are they the right distance apart?
@@ -116,49 +288,110 @@ def sanity_check(left_fit, right_fit, img_height):
     distance = right_x - left_x
     # Plausible distance in our warped view (from offset=300)
     # Expected: 1280 - 600 = 680
-    if not (500 < distance < 850): 
+    if not (min_lane_width * scale < distance < max_lane_width * scale): 
         return None, None # Wrong distance, FAIL and return
         
     # All checks passed!
     return left_fit, right_fit
 
-def find_lane_fits(binary_warped):
+def is_tracking(left_line, right_line, min_confidence=0.5):
+    """
+    True if both Line objects are well enough tracked to skip the blind search.
+    """
+    if left_line is None or right_line is None:
+        return False
+    for line in (left_line, right_line):
+        if not line.detected or line.current_fit is None:
+            return False
+        # Last frame must have been a good detection
+        if line.frames_since_detected > 0 or line.confidence < min_confidence:
+            return False
+    return True
+
+def blind_search(binary_warped, debug=False, margin=100, min_pix=50, n_windows=9, moments=None):
+    """
+    Histogram + sliding window search from scratch.
+    moments: optional (left, right) FitMoments to accumulate the pixels into, see sliding_window_search().
+    """
+    left_x_base, right_x_base = histogram(binary_warped)
+    return sliding_window_search(binary_warped, left_x_base, right_x_base, debug=debug,
+                                 n_windows=n_windows, margin=margin, min_pix=min_pix, moments=moments)
+
+def draw_fit(debug_img, fit, color):
+    """
+    Draws a fitted polynomial onto the debug image as a single polyline.
+    """
+    ploty = np.arange(debug_img.shape[0])
+    fitx = fit[0]*ploty**2 + fit[1]*ploty + fit[2]
+    pts = np.int32(np.column_stack((fitx, ploty)))
+    cv2.polylines(debug_img, [pts], False, color, 4)
+
+def find_lane_fits(binary_warped, left_line=None, right_line=None, debug=False, near_weight=0.0,
+                   scale=1.0, config=None):
     """
     Main function for this module.
+    If left_line/right_line (temporal.Line) are given and tracked with good
+    confidence, searches around their current fits; otherwise (or if the
+    targeted fit fails the sanity check) falls back to the blind search.
+    The debug image is only built (and None otherwise) if debug is True.
+    near_weight > 0 weights pixels near the car more in the fit (see fit_polynomial).
+    scale: resolution of binary_warped relative to the Line fits (e.g. 0.5 for a
+    half-size frame). The pixel thresholds are scaled to match, and the returned
+    fits and pixel counts are converted back to the Line (full) resolution.
+    config: optional config.LaneConfig with the search and sanity check thresholds.
     Returns: left_fit, right_fit, debug_image, left_pixel_count, right_pixel_count
     """
+    left_fit_checked, right_fit_checked = None, None
+    height = binary_warped.shape[0]
+    config = config or DEFAULT_CONFIG
+    bounds = {'max_curve_diff': config.max_curve_diff, 'min_lane_width': config.min_lane_width,
+              'max_lane_width': config.max_lane_width}
     
-    left_x_base, right_x_base = histogram(binary_warped)
-    
-    leftx, lefty, rightx, righty, debug_img = sliding_window_search(
-        binary_warped, left_x_base, right_x_base
-    )
-    
-    # Get the raw polynomial fits
-    left_fit_raw, right_fit_raw = fit_polynomial(leftx, lefty, rightx, righty)
-    
-    # Run sanity checks
-    left_fit_checked, right_fit_checked = sanity_check(
-        left_fit_raw, right_fit_raw, binary_warped.shape[0]
-    )
+    # Thresholds tuned for full resolution (pixel counts scale with the area)
+    margin = max(1, int(round(config.margin * scale)))
+    min_pix = max(1, int(round(config.min_pix * scale**2)))
+
+    # 1. Targeted search around the previous fits
+    if is_tracking(left_line, right_line):
+        leftx, lefty, rightx, righty, debug_img = search_around_poly(
+            binary_warped, scale_fit(left_line.current_fit, scale),
+            scale_fit(right_line.current_fit, scale), margin=margin, debug=debug
+        )
+        left_fit_raw, right_fit_raw = fit_polynomial(
+            leftx, lefty, rightx, righty, height, near_weight
+        )
+        left_fit_checked, right_fit_checked = sanity_check(
+            left_fit_raw, right_fit_raw, height, scale, **bounds
+        )
+
+    # 2. Blind search (not tracking, or the targeted fit failed)
+    if left_fit_checked is None or right_fit_checked is None:
+        # The raw polynomial fits come from the moments accumulated window by window
+        moments = (FitMoments(height, near_weight), FitMoments(height, near_weight))
+        leftx, lefty, rightx, righty, debug_img = blind_search(
+            binary_warped, debug=debug, margin=margin, min_pix=min_pix, n_windows=config.n_windows,
+            moments=moments
+        )
+        left_fit_raw, right_fit_raw = moments[0].solve(), moments[1].solve()
+
+        # Run sanity checks
+        left_fit_checked, right_fit_checked = sanity_check(
+            left_fit_raw, right_fit_raw, height, scale, **bounds
+        )
 
     # --- Add the fitted lines to the debug image ---
-    if left_fit_checked is not None:
-        ploty = np.linspace(0, binary_warped.shape[0]-1, binary_warped.shape[0])
-        try:
-            left_fitx = left_fit_checked[0]*ploty**2 + left_fit_checked[1]*ploty + left_fit_checked[2]
-            for i in range(len(ploty)):
-                cv2.circle(debug_img, (int(left_fitx[i]), int(ploty[i])), 2, (255, 255, 0), -1) # Yellow
-        except TypeError:
-            pass # Should not happen now, but good to keep
-
-    if right_fit_checked is not None:
-        ploty = np.linspace(0, binary_warped.shape[0]-1, binary_warped.shape[0])
-        try:
-            right_fitx = right_fit_checked[0]*ploty**2 + right_fit_checked[1]*ploty + right_fit_checked[2]
-            for i in range(len(ploty)):
-                cv2.circle(debug_img, (int(right_fitx[i]), int(ploty[i])), 2, (0, 255, 255), -1) # Cyan
-        except TypeError:
-            pass
-
-    return left_fit_checked, right_fit_checked, debug_img, len(leftx), len(rightx)
\ No newline at end of file
+    if debug:
+        if left_fit_checked is not None:
+            draw_fit(debug_img, left_fit_checked, (255, 255, 0)) # Yellow
+        if right_fit_checked is not None:
+            draw_fit(debug_img, right_fit_checked, (0, 255, 255)) # Cyan
+
+    left_count, right_count = len(leftx), len(rightx)
+    if scale != 1.0:
+        # Back to the Line resolution
+        left_fit_checked = scale_fit(left_fit_checked, 1 / scale)
+        right_fit_checked = scale_fit(right_fit_checked, 1 / scale)
+        left_count = int(round(left_count / scale**2))
+        right_count = int(round(right_count / scale**2))
+
+    return left_fit_checked, right_fit_checked, debug_img, left_count, right_count
\ No newline at end of file
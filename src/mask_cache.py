@@ -0,0 +1,105 @@
+# src/mask_cache.py
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from frame_log import npy_header
+
+def cache_key(input_path, M, settings):
+    """
+    Identifies the warped masks of one clip: the input file (path, size, mtime), the
+    calibration (M) and the settings that change the masks (preprocess mode, scale, ...).
+    """
+    stat = os.stat(input_path)
+    h = hashlib.sha1()
+    h.update(os.path.abspath(input_path).encode())
+    h.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    h.update(np.ascontiguousarray(M, dtype=np.float64).tobytes())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+def cache_path(cache_dir, input_path, M, settings):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(cache_dir, f"{stem}_{cache_key(input_path, M, settings)}.masks.npy")
+
+class MaskCacheWriter:
+    def __init__(self, path, info=None):
+        """
+        Streams the warped 0/1 masks of a clip into a .npy of bit-packed rows
+        (n_frames, height, ceil(width / 8)) uint8, 1/8 of the mask size.
+        Written to a temporary file that only replaces 'path' on close, so an
+        interrupted run never leaves a truncated cache behind.
+        info: extra metadata for the sidecar .json (e.g. the input and settings)
+        """
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.info = dict(info or {})
+        self.mask_shape = None
+        self.n_frames = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(self.tmp_path, 'wb')
+
+    def append(self, mask):
+        """
+        Adds the warped mask of the next frame (uint8 0/1, same size on every frame).
+        """
+        if self.mask_shape is None:
+            self.mask_shape = mask.shape
+            self.packed_shape = (mask.shape[0], (mask.shape[1] + 7) // 8)
+            self.file.write(npy_header(np.dtype(np.uint8), (0,) + self.packed_shape))
+        self.file.write(np.packbits(mask, axis=1).tobytes())
+        self.n_frames += 1
+
+    def close(self):
+        """
+        Writes the final frame count into the header and moves the cache into place.
+        """
+        if self.file is None:
+            return
+        if self.mask_shape is None:
+            # Nothing recorded
+            self.file.close()
+            os.remove(self.tmp_path)
+            self.file = None
+            return
+
+        self.file.seek(0)
+        self.file.write(npy_header(np.dtype(np.uint8), (self.n_frames,) + self.packed_shape))
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_path, self.path)
+
+        self.info.update({'frames': self.n_frames, 'height': self.mask_shape[0], 'width': self.mask_shape[1]})
+        with open(self.path + '.json', 'w') as f:
+            json.dump(self.info, f, indent=2)
+        print(f"Saved {self.n_frames} warped masks to: {self.path}")
+
+    def discard(self):
+        """
+        Drops an incomplete recording (an interrupted or stopped run): removes the temporary file.
+        """
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.remove(self.tmp_path)
+
+def load_mask_cache(path):
+    """
+    Opens a complete cache. Returns (packed memmap, info dict), or None if there is none.
+    """
+    if not (os.path.exists(path) and os.path.exists(path + '.json')):
+        return None
+    with open(path + '.json') as f:
+        info = json.load(f)
+    return np.load(path, mmap_mode='r'), info
+
+def iter_masks(packed, width, start=0):
+    """
+    Yields the cached warped masks (uint8 0/1, height x width) from frame 'start' on.
+    """
+    for i in range(start, len(packed)):
+        yield np.unpackbits(packed[i], axis=1, count=width)
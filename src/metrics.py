@@ -19,57 +19,57 @@ def define_metrics(img_size, warped_width_px):
     
     return xm_per_pix, ym_per_pix
 
-def calculate_curvature_m(left_fit, right_fit, ploty, xm_per_pix, ym_per_pix):
+def fit_to_meters(fits, xm_per_pix, ym_per_pix):
     """
-    Calculates the radius of curvature in meters.
+    Rescales pixel-space fits x = A*y^2 + B*y + C to meter space exactly
+    (no re-fitting needed for a quadratic).
+    fits: (..., 3) array of coefficients. Returns an array of the same shape.
     """
-    if left_fit is None or right_fit is None:
-        return 0, 0 # Return 0 if fit failed
-        
-    # We'll measure curvature at the bottom of the image (closest to the car)
-    y_eval = np.max(ploty) * ym_per_pix # y-position in meters
+    fits = np.asarray(fits, dtype=np.float64)
+    scale = np.array([xm_per_pix / ym_per_pix**2, xm_per_pix / ym_per_pix, xm_per_pix])
+    return fits * scale
 
-    # Re-fit polynomials to x,y in meters
-    left_fit_cr = np.polyfit(ploty * ym_per_pix, 
-                             (left_fit[0]*ploty**2 + left_fit[1]*ploty + left_fit[2]) * xm_per_pix, 2)
-    right_fit_cr = np.polyfit(ploty * ym_per_pix, 
-                              (right_fit[0]*ploty**2 + right_fit[1]*ploty + right_fit[2]) * xm_per_pix, 2)
-
-    # Calculate radius using the formula: R = (1 + (2Ay + B)^2)^(3/2) / |2A|
-    A_left = left_fit_cr[0]
-    B_left = left_fit_cr[1]
-    left_curve_rad = ((1 + (2*A_left*y_eval + B_left)**2)**1.5) / np.absolute(2*A_left)
-    
-    A_right = right_fit_cr[0]
-    B_right = right_fit_cr[1]
-    right_curve_rad = ((1 + (2*A_right*y_eval + B_right)**2)**1.5) / np.absolute(2*A_right)
+def curvature_radius_m(fits, y_eval_px, xm_per_pix, ym_per_pix):
+    """
+    Vectorised radius of curvature in meters at y_eval_px (pixel row) for an array of fits.
+    fits: (..., 3) array of pixel-space coefficients. Returns an array of shape fits.shape[:-1].
+    """
+    fits_m = fit_to_meters(fits, xm_per_pix, ym_per_pix)
+    A = fits_m[..., 0]
+    B = fits_m[..., 1]
+    y_eval = y_eval_px * ym_per_pix # y-position in meters
     
-    return left_curve_rad, right_curve_rad
+    # R = (1 + (2Ay + B)^2)^(3/2) / |2A|  (a straight line has infinite radius)
+    with np.errstate(divide='ignore'):
+        return ((1 + (2*A*y_eval + B)**2)**1.5) / np.absolute(2*A)
 
-def calculate_offset_m(left_fit, right_fit, img_width, xm_per_pix):
+def lateral_offset_m(left_fits, right_fits, img_width, y_eval_px, xm_per_pix):
     """
-    Calculates the car's lateral offset from the lane center in meters.
+    Vectorised lateral offset from the lane center in meters (positive = car left of center).
+    left_fits, right_fits: (..., 3) arrays of pixel-space coefficients.
     """
-    if left_fit is None or right_fit is None:
-        return 0.0 # No fit, assume center
-        
-    # Y-position to measure at (bottom of the image)
-    y_eval = 719 # Image height - 1
+    left_fits = np.asarray(left_fits, dtype=np.float64)
+    right_fits = np.asarray(right_fits, dtype=np.float64)
     
-    # Find x position of left and right lanes at the bottom
-    left_x_px = left_fit[0]*y_eval**2 + left_fit[1]*y_eval + left_fit[2]
-    right_x_px = right_fit[0]*y_eval**2 + right_fit[1]*y_eval + right_fit[2]
+    left_x_px = left_fits[..., 0]*y_eval_px**2 + left_fits[..., 1]*y_eval_px + left_fits[..., 2]
+    right_x_px = right_fits[..., 0]*y_eval_px**2 + right_fits[..., 1]*y_eval_px + right_fits[..., 2]
     
-    # Find lane center in pixels
     lane_center_px = (left_x_px + right_x_px) / 2
-    
-    # Find car center in pixels
     car_center_px = img_width / 2
+    return (car_center_px - lane_center_px) * xm_per_pix
+
+def compute_metrics(left_fits, right_fits, img_size, xm_per_pix, ym_per_pix):
+    """
+    Offset and curvature for a whole run's fit history in one call.
+    left_fits, right_fits: (N, 3) arrays of pixel-space fits (NaN rows for missing fits give NaN),
+    or a single pair of (3,) fits (scalar results, as in detector.lane_metrics).
+    img_size: (width, height) of the frames the fits belong to (any resolution).
+    Returns (lat_offset_m, left_curve_m, right_curve_m), each of shape (N,).
+    """
+    width, height = img_size
+    y_eval_px = height - 1 # Bottom of the image (closest to the car)
     
-    # Calculate offset in pixels
-    offset_px = car_center_px - lane_center_px
-    
-    # Convert to meters
-    offset_m = offset_px * xm_per_pix
-    
-    return offset_m
\ No newline at end of file
+    lat_offset_m = lateral_offset_m(left_fits, right_fits, width, y_eval_px, xm_per_pix)
+    left_curve_m = curvature_radius_m(left_fits, y_eval_px, xm_per_pix, ym_per_pix)
+    right_curve_m = curvature_radius_m(right_fits, y_eval_px, xm_per_pix, ym_per_pix)
+    return lat_offset_m, left_curve_m, right_curve_m
@@ -1,39 +1,65 @@
 # src/overlay.py
+import functools
+
 import cv2
 import numpy as np
 
-def draw_lane_overlay(original_image, Minv, left_line, right_line, lat_offset_m, avg_curve_rad_m):
+@functools.lru_cache(maxsize=4)
+def _ploty(height):
+    # Row coordinates (same values as np.linspace(0, height-1, height)), built once per height
+    ploty = np.arange(height, dtype=np.float64)
+    ploty.flags.writeable = False
+    return ploty
+
+def lane_polygon(left_fit, right_fit, Minv, img_size):
     """
-    Draws the detected lane polygon and the full HUD with metrics.
+    Lane polygon in original image space: the fitted boundaries (in warped space)
+    projected through Minv. Returns an int32 (N, 2) array of points.
+    """
+    width, height = img_size
+    ploty = _ploty(height)
+    
+    # Clip to the warped view, like the old full-frame warp did
+    left_fitx = np.clip(left_fit[0]*ploty**2 + left_fit[1]*ploty + left_fit[2], 0, width - 1)
+    right_fitx = np.clip(right_fit[0]*ploty**2 + right_fit[1]*ploty + right_fit[2], 0, width - 1)
+    
+    pts_left = np.transpose(np.vstack([left_fitx, ploty]))
+    pts_right = np.flipud(np.transpose(np.vstack([right_fitx, ploty])))
+    pts = np.vstack((pts_left, pts_right)).reshape(-1, 1, 2)
+    
+    return np.int_(cv2.perspectiveTransform(pts, Minv).reshape(-1, 2))
+
+def blend_polygon(image, pts, color, alpha):
     """
+    Alpha-blends a filled polygon into image (in place), touching only its bounding box.
+    Same arithmetic as addWeighted(image, 1, polygon_image, alpha, 0) on the full frame.
+    """
+    height, width = image.shape[:2]
+    x0, y0 = np.maximum(pts.min(axis=0), 0)
+    x1, y1 = np.minimum(pts.max(axis=0) + 1, (width, height))
+    if x1 <= x0 or y1 <= y0:
+        return image # Entirely outside the frame
     
-    # Create a blank image to draw the lane polygon on
-    warp_zero = np.zeros_like(original_image[:,:,0]).astype(np.uint8)
-    color_warp = np.dstack((warp_zero, warp_zero, warp_zero))
+    roi = image[y0:y1, x0:x1]
+    poly_img = np.zeros_like(roi)
+    cv2.fillPoly(poly_img, [pts - (x0, y0)], color)
+    cv2.addWeighted(roi, 1, poly_img, alpha, 0, dst=roi)
+    return image
 
-    ploty = np.linspace(0, original_image.shape[0]-1, original_image.shape[0])
+def draw_lane_overlay(original_image, Minv, left_line, right_line, lat_offset_m, avg_curve_rad_m):
+    """
+    Draws the detected lane polygon and the full HUD with metrics.
+    Draws in place into original_image (pass a copy to keep the frame) and returns it.
+    """
+    result = original_image
+    img_size = (original_image.shape[1], original_image.shape[0])
     
     # Check if lines were continuously detected
     if left_line.detected and right_line.detected:
-        left_fit = left_line.current_fit
-        right_fit = right_line.current_fit
+        pts = lane_polygon(left_line.current_fit, right_line.current_fit, Minv, img_size)
         
-        left_fitx = left_fit[0]*ploty**2 + left_fit[1]*ploty + left_fit[2]
-        right_fitx = right_fit[0]*ploty**2 + right_fit[1]*ploty + right_fit[2]
-
-        pts_left = np.array([np.transpose(np.vstack([left_fitx, ploty]))])
-        pts_right = np.array([np.flipud(np.transpose(np.vstack([right_fitx, ploty])))])
-        pts = np.hstack((pts_left, pts_right))
-
-        # Draw the lane polygon (green)
-        cv2.fillPoly(color_warp, np.int_([pts]), (0, 255, 0))
-    
-    # Warp the polygon back to original image space
-    new_warp = cv2.warpPerspective(color_warp, Minv, 
-                                   (original_image.shape[1], original_image.shape[0]))
-
-    # Combine the result with the original image
-    result = cv2.addWeighted(original_image, 1, new_warp, 0.3, 0)
+        # Draw the lane polygon (green), blended only where it is
+        blend_polygon(result, pts, (0, 255, 0), 0.3)
     
     # --- Draw the Full HUD ---
     # Detection Status
@@ -54,9 +80,11 @@ def draw_lane_overlay(original_image, Minv, left_line, right_line, lat_offset_m,
 
     # --- TAKE OVER Warning ---
     if not left_line.detected or not right_line.detected:
-        overlay = result.copy()
-        cv2.rectangle(overlay, (0, 250), (original_image.shape[1], 350), (255, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.5, result, 0.5, 0, result)
+        # Blend only the banner strip
+        strip = result[250:351]
+        banner = np.empty_like(strip)
+        banner[:] = (255, 0, 0)
+        cv2.addWeighted(banner, 0.5, strip, 0.5, 0, strip)
         
         cv2.putText(result, "DRIVER TAKE OVER", (int(original_image.shape[1] / 2) - 300, 320), 
                     cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
@@ -2,38 +2,83 @@
 import cv2
 import numpy as np
 
-def preprocess_image(image):
+# Threshold ranges (inclusive)
+S_THRESH = (100, 255)   # S-channel (color)
+L_THRESH = (120, 255)   # L-channel (brightness)
+SX_THRESH = (20, 120)   # Scaled Sobel X on the L-channel (vertical edges)
+
+# The 3x3 Sobel X of a uint8 image is at most 4 * 255 in magnitude
+_SOBEL_MAX = 4 * 255
+_SOBEL_VALUES = np.arange(_SOBEL_MAX + 1, dtype=np.float64)
+
+def sobel_thresh_range(max_abs_sobel, thresh=SX_THRESH):
+    """
+    Translates the threshold on the 0-255 scaled |Sobel| into a range on the raw |Sobel|.
+    Uses the exact same scaling formula as the original float pipeline, so the result is identical.
+    Returns (low, high), or None if no raw value falls into the range.
+    """
+    scaled = np.uint8(255 * _SOBEL_VALUES[:max_abs_sobel + 1] / (max_abs_sobel + 1e-6))
+    in_range = np.flatnonzero((scaled >= thresh[0]) & (scaled <= thresh[1]))
+    if len(in_range) == 0:
+        return None
+    # The scaling is monotonic, so the valid raw values are contiguous
+    return int(in_range[0]), int(in_range[-1])
+
+def scratch(buffers, name, shape, dtype=np.uint8):
+    """
+    Buffer 'name' from the buffers dict, (re)allocated if missing or of another shape.
+    Returns None if buffers is None (the caller allocates as usual).
+    """
+    if buffers is None:
+        return None
+    buf = buffers.get(name)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = buffers[name] = np.empty(shape, dtype=dtype)
+    return buf
+
+def preprocess_image(image, out=None, buffers=None, config=None):
+    """
+    Thresholds a BGR frame into a 0/1 lane mask: Color OR (Edge AND Bright).
+    out: optional uint8 (H, W) buffer to write the mask into (reused across frames).
+    buffers: optional dict of scratch images kept between calls (no per-frame allocation).
+    config: optional config.LaneConfig with the threshold ranges (default: the constants above).
+    """
+    shape = image.shape[:2]
+    s_thresh, l_thresh, sx_thresh = S_THRESH, L_THRESH, SX_THRESH
+    if config is not None:
+        s_thresh, l_thresh, sx_thresh = config.s_thresh, config.l_thresh, config.sx_thresh
+
     # Convert to HLS.
-    hls = cv2.cvtColor(image, cv2.COLOR_BGR2HLS)
-    s_channel = hls[:, :, 2]  # S channel (Saturation)
-    l_channel = hls[:, :, 1]  # L channel (Lightness)
-    
-    # 1. S-channel thresholding (for color)
-    s_thresh_min = 100
-    s_thresh_max = 255
-    s_binary = np.zeros_like(s_channel)
-    s_binary[(s_channel >= s_thresh_min) & (s_channel <= s_thresh_max)] = 1
-    
+    hls = cv2.cvtColor(image, cv2.COLOR_BGR2HLS, dst=scratch(buffers, 'hls', image.shape))
+    l_channel = cv2.extractChannel(hls, 1, dst=scratch(buffers, 'l_channel', shape))  # L channel (Lightness)
+
+    # 1. S-channel thresholding (for color), 0/255 mask
+    s_binary = cv2.inRange(hls, (0, 0, s_thresh[0]), (255, 255, s_thresh[1]),
+                           dst=scratch(buffers, 's_binary', shape))
+
     # 2. L-channel thresholding (for brightness)
     # Lane lines are bright, asphalt edges are not
-    l_thresh_min = 120
-    l_thresh_max = 255
-    l_binary = np.zeros_like(l_channel)
-    l_binary[(l_channel >= l_thresh_min) & (l_channel <= l_thresh_max)] = 1
-    
+    l_binary = cv2.inRange(l_channel, l_thresh[0], l_thresh[1], dst=scratch(buffers, 'l_binary', shape))
+
     # 3. Sobel X on L-channel (for vertical edges)
-    sobelx = cv2.Sobel(l_channel, cv2.CV_64F, 1, 0)
-    abs_sobelx = np.absolute(sobelx)
-    scaled_sobel = np.uint8(255 * abs_sobelx / (np.max(abs_sobelx) + 1e-6))
-    
-    sx_thresh_min = 20
-    sx_thresh_max = 120
-    sx_binary = np.zeros_like(scaled_sobel)
-    sx_binary[(scaled_sobel >= sx_thresh_min) & (scaled_sobel <= sx_thresh_max)] = 1
-    
+    # int16 is exact for a 3x3 Sobel on uint8, no float image needed
+    abs_sobelx = cv2.Sobel(l_channel, cv2.CV_16S, 1, 0, dst=scratch(buffers, 'sobelx', shape, np.int16))
+    np.abs(abs_sobelx, out=abs_sobelx)
+    sx_range = sobel_thresh_range(int(abs_sobelx.max()), sx_thresh)
+
     # 4. Combine the masks
     # (Color OR (Edge AND Bright))
-    combined_binary = np.zeros_like(sx_binary)
-    combined_binary[(s_binary == 1) | ((sx_binary == 1) & (l_binary == 1))] = 1
-    
-    return combined_binary
\ No newline at end of file
+    if out is None:
+        out = scratch(buffers, 'mask', shape)
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    if sx_range is not None:
+        sx_binary = cv2.inRange(abs_sobelx, sx_range[0], sx_range[1], dst=scratch(buffers, 'sx_binary', shape))
+        cv2.bitwise_and(sx_binary, l_binary, dst=out)
+        cv2.bitwise_or(out, s_binary, dst=out)
+    else:
+        out[:] = s_binary
+
+    # 0/255 -> 0/1
+    cv2.bitwise_and(out, 1, dst=out)
+    return out
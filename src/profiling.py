@@ -0,0 +1,84 @@
+# src/profiling.py
+import contextlib
+import cProfile
+import pstats
+import time
+import tracemalloc
+
+# Stages timed by the pipeline, in CSV column order
+STAGES = ['preprocess', 'warp', 'lane_fit', 'update', 'metrics', 'overlay']
+
+class StageTimer:
+    def __init__(self):
+        """
+        Collects per-stage wall-clock times (seconds) and pixel counts for one frame.
+        """
+        self.times = {}
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+
+    def reset(self):
+        self.times = {}
+        self.counts = {}
+
+    @staticmethod
+    def csv_headers():
+        return [f"t_{stage}_ms" for stage in STAGES] + ["t_total_ms", "left_pixels", "right_pixels"]
+
+    def csv_values(self):
+        """
+        Values for the columns in csv_headers() (stages that did not run are 0).
+        """
+        values = [f"{self.times.get(stage, 0.0) * 1000:.3f}" for stage in STAGES]
+        values.append(f"{sum(self.times.values()) * 1000:.3f}")
+        values.append(self.counts.get('left_pixels', 0))
+        values.append(self.counts.get('right_pixels', 0))
+        return tuple(values)
+
+def timed(timer, name):
+    """
+    timer.stage(name) if timing is enabled (timer is not None), otherwise a no-op.
+    """
+    if timer is None:
+        return contextlib.nullcontext()
+    return timer.stage(name)
+
+def run_profiled(fn, *args, cprofile_path=None, trace_malloc=False, top=20):
+    """
+    Runs fn(*args) under cProfile and/or tracemalloc and prints a summary at the end.
+    cprofile_path: where to dump the raw cProfile stats (load with pstats / snakeviz)
+    """
+    profiler = None
+    if trace_malloc:
+        tracemalloc.start()
+    if cprofile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    try:
+        return fn(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if trace_malloc:
+            # Snapshot before printing anything, so the report does not trace itself
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        
+        if profiler is not None:
+            profiler.dump_stats(cprofile_path)
+            print(f"\n--- cProfile (top {top} by cumulative time), saved to: {cprofile_path} ---")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+        
+        if trace_malloc:
+            print(f"\n--- tracemalloc: current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB ---")
+            for stat in snapshot.statistics('lineno')[:top]:
+                print(f"  {stat}")
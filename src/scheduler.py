@@ -0,0 +1,98 @@
+# src/scheduler.py
+import numpy as np
+
+from lane_fit import is_tracking
+
+class DetectionScheduler:
+    def __init__(self, interval=3, min_confidence=0.9, stable_frames=10, extrapolate=False):
+        """
+        Decides per frame whether to run full detection (preprocess + warp + fit)
+        or to reuse the tracked Line state.
+        interval: while stable, measure only every Nth frame (1 = every frame)
+        min_confidence: both lines need at least this confidence to count as stable
+        stable_frames: consecutive good measurements needed before frames are skipped
+        extrapolate: on skipped frames, move the fits along at their last measured
+                     rate of change instead of just reusing them
+        """
+        self.interval = interval
+        self.min_confidence = min_confidence
+        self.stable_frames = stable_frames
+        self.extrapolate = extrapolate
+        
+        self.stable_count = 0
+        self.frames_since_measured = 0
+        
+        # For extrapolation: fits after the last measurement, and their change per frame
+        self.last_fits = (None, None)
+        self.velocity = (None, None)
+
+    def get_state(self):
+        """
+        The cadence and extrapolation state as plain (JSON-friendly) values, e.g. for a checkpoint.
+        """
+        def fits(pair):
+            return [None if fit is None else fit.tolist() for fit in pair]
+        return {'stable_count': self.stable_count, 'frames_since_measured': self.frames_since_measured,
+                'last_fits': fits(self.last_fits), 'velocity': fits(self.velocity)}
+
+    def set_state(self, state):
+        def fits(pair):
+            return tuple(None if fit is None else np.array(fit) for fit in pair)
+        self.stable_count = state['stable_count']
+        self.frames_since_measured = state['frames_since_measured']
+        self.last_fits = fits(state['last_fits'])
+        self.velocity = fits(state['velocity'])
+
+    def is_stable(self, left_line, right_line):
+        """
+        Same check as the targeted search (lane_fit.is_tracking), with this scheduler's
+        (stricter) min_confidence.
+        """
+        return is_tracking(left_line, right_line, self.min_confidence)
+
+    def should_measure(self, left_line, right_line):
+        """
+        True if this frame needs full detection.
+        """
+        if self.interval <= 1 or self.stable_count < self.stable_frames:
+            return True
+        if not self.is_stable(left_line, right_line):
+            return True
+        return self.frames_since_measured + 1 >= self.interval
+
+    def predict(self, left_line, right_line):
+        """
+        Call on a skipped frame (before rendering): extrapolates the fits if enabled.
+        """
+        if not self.extrapolate:
+            return
+        for line, velocity in zip((left_line, right_line), self.velocity):
+            if velocity is not None and line.current_fit is not None:
+                line.current_fit = line.current_fit + velocity
+
+    def update(self, measured, left_line, right_line):
+        """
+        Call after every frame with whether it was measured.
+        """
+        if not measured:
+            self.frames_since_measured += 1
+            return
+        
+        gap = self.frames_since_measured + 1
+        self.frames_since_measured = 0
+        
+        if self.is_stable(left_line, right_line):
+            self.stable_count += 1
+        else:
+            self.stable_count = 0 # Back to every-frame detection
+        
+        # Rate of change of the smoothed fits since the last measurement
+        fits = (left_line.current_fit, right_line.current_fit)
+        velocity = []
+        for fit, last_fit in zip(fits, self.last_fits):
+            if fit is None or last_fit is None or self.stable_count == 0:
+                velocity.append(None)
+            else:
+                velocity.append((fit - last_fit) / gap)
+        self.velocity = tuple(velocity)
+        self.last_fits = tuple(None if fit is None else np.copy(fit) for fit in fits)
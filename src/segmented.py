@@ -0,0 +1,193 @@
+# src/segmented.py
+import csv
+import multiprocessing
+import os
+import shutil
+import subprocess
+
+import cv2
+
+from temporal import Line
+from scheduler import DetectionScheduler
+from frame_log import frame_row
+
+def init_worker():
+    """
+    Pool initializer for the worker processes (segments, batch clips, sweep configs):
+    there is one process per core already, so OpenCV should not start its own threads.
+    """
+    cv2.setNumThreads(1)
+
+def split_ranges(n_frames, n_segments):
+    """
+    Splits [0, n_frames) into n_segments contiguous (start, end) ranges.
+    The last range has end=None so it reads until EOF (frame counts are not always exact).
+    """
+    n_segments = max(1, min(n_segments, n_frames))
+    bounds = [round(i * n_frames / n_segments) for i in range(n_segments + 1)]
+    ranges = [(bounds[i], bounds[i + 1]) for i in range(n_segments)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+def process_segment(input_path, start, end, warmup, process_fn, calibration,
+                    chunk_path=None, fps=25, img_size=None, video_every=1, line_args=None,
+                    frame_kwargs=None, scheduler_args=None, log_details=False):
+    """
+    Worker: processes frames [start, end) of a video with its own Line pair.
+    The 'warmup' frames before 'start' are run first (no output) so the
+    smoothed Line state converges to what the serial run would have.
+    line_args: keyword arguments for both temporal.Line (alpha, max_frames_lost).
+    frame_kwargs: extra keyword arguments for process_fn.
+    scheduler_args: if given, a DetectionScheduler(**scheduler_args) decides which frames
+    are measured, and each row gets a 'measured' extra column.
+    log_details: also snapshot the frame_log.frame_details of each frame (for .npy logs).
+    Returns a list of CSV values (left_detected, right_detected, left_conf, right_conf, lat_offset_m, extra,
+    details), details being the frame_details keyword arguments (empty without log_details).
+    """
+    frame_kwargs = frame_kwargs or {}
+
+    M, Minv, xm_per_pix, ym_per_pix = calibration
+    left_line = Line(**(line_args or {}))
+    right_line = Line(**(line_args or {}))
+    scheduler = DetectionScheduler(**scheduler_args) if scheduler_args else None
+
+    cap = cv2.VideoCapture(input_path)
+    frame_id = max(0, start - warmup)
+    if frame_id > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+
+    out = None
+    if chunk_path is not None:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(chunk_path, fourcc, fps, img_size)
+
+    rows = []
+    while end is None or frame_id < end:
+        ret, frame = cap.read()
+        if not ret: break
+
+        measure = True
+        if scheduler is not None:
+            measure = scheduler.should_measure(left_line, right_line)
+            if not measure:
+                scheduler.predict(left_line, right_line)
+
+        if frame_id < start:
+            # Warm-up: only update the Line state
+            process_fn(frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, render=False,
+                       measure=measure, **frame_kwargs)
+        else:
+            write_video = out is not None and frame_id % video_every == 0
+            processed_frame, _, ll, rl, lat_offset_m = process_fn(
+                frame, M, Minv, left_line, right_line, xm_per_pix, ym_per_pix, render=write_video,
+                measure=measure, **frame_kwargs
+            )
+            if write_video:
+                out.write(processed_frame)
+            detail_args = (frame.shape[0], xm_per_pix, ym_per_pix) if log_details else None
+            csv_values, details = frame_row(ll, rl, lat_offset_m, measure if scheduler is not None else None,
+                                            detail_args=detail_args)
+            rows.append(csv_values + (details,))
+
+        if scheduler is not None:
+            scheduler.update(measure, left_line, right_line)
+        frame_id += 1
+
+    cap.release()
+    if out is not None:
+        out.release()
+    return rows
+
+def merge_video_chunks(chunk_paths, out_path, fps, img_size):
+    """
+    Concatenates the per-segment videos in order.
+    Uses ffmpeg stream copy if available, otherwise re-encodes with OpenCV.
+    """
+    if shutil.which('ffmpeg'):
+        list_path = f"{out_path}.chunks.txt"
+        with open(list_path, 'w') as f:
+            for path in chunk_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        result = subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                                 '-i', list_path, '-c', 'copy', out_path])
+        os.remove(list_path)
+        if result.returncode == 0:
+            return
+        print("Warning: ffmpeg concat failed, re-encoding the chunks instead.")
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(out_path, fourcc, fps, img_size)
+    for path in chunk_paths:
+        cap = cv2.VideoCapture(path)
+        while True:
+            ret, frame = cap.read()
+            if not ret: break
+            out.write(frame)
+        cap.release()
+    out.release()
+
+def run_segmented(input_path, n_frames, n_segments, warmup, process_fn, calibration, csv_log,
+                  out_path=None, fps=25, img_size=None, video_every=1, line_args=None, frame_kwargs=None,
+                  scheduler_args=None, log_details=False):
+    """
+    Processes a video as n_segments frame ranges in a process pool and merges
+    the CSV rows (and annotated video chunks, if out_path is given) back in order.
+    log_details: csv_log is a frame_log.FrameLogWriter and gets the fits and curvature too.
+    Returns the number of frames processed.
+    """
+    ranges = split_ranges(n_frames, n_segments)
+
+    chunk_paths = [None] * len(ranges)
+    if out_path is not None:
+        chunk_paths = [f"{out_path}.part{i:03d}.mp4" for i in range(len(ranges))]
+
+    jobs = []
+    for (start, end), chunk_path in zip(ranges, chunk_paths):
+        jobs.append((str(input_path), start, end, warmup, process_fn, calibration,
+                     chunk_path, fps, img_size, video_every, line_args, frame_kwargs, scheduler_args,
+                     log_details))
+
+    print(f"Processing {len(ranges)} segments ({warmup} warm-up frames each)...")
+    with multiprocessing.Pool(len(ranges), initializer=init_worker) as pool:
+        results = pool.starmap(process_segment, jobs)
+
+    frame_count = 0
+    for rows in results:
+        for *values, details in rows:
+            csv_log.write_values(*values, **details)
+        frame_count += len(rows)
+
+    if out_path is not None:
+        merge_video_chunks(chunk_paths, out_path, fps, img_size)
+        for path in chunk_paths:
+            os.remove(path)
+
+    return frame_count
+
+def compare_csv_logs(path_a, path_b, tol=0.05):
+    """
+    Compares two per-frame CSV logs (e.g. segmented vs. serial run).
+    Detection flags must match; conf/offset columns must be within tol.
+    Returns (ok, report) where report is a dict of mismatch counts.
+    """
+    with open(path_a, newline='') as f:
+        rows_a = list(csv.DictReader(f))
+    with open(path_b, newline='') as f:
+        rows_b = list(csv.DictReader(f))
+
+    report = {'frames': min(len(rows_a), len(rows_b)), 'length_diff': len(rows_a) - len(rows_b),
+              'detection_mismatches': 0, 'value_mismatches': 0, 'max_abs_diff': 0.0}
+
+    for row_a, row_b in zip(rows_a, rows_b):
+        if (row_a['left_detected'] != row_b['left_detected'] or
+                row_a['right_detected'] != row_b['right_detected']):
+            report['detection_mismatches'] += 1
+        for col in ('left_conf', 'right_conf', 'lat_offset_m'):
+            diff = abs(float(row_a[col]) - float(row_b[col]))
+            report['max_abs_diff'] = max(report['max_abs_diff'], diff)
+            if diff > tol:
+                report['value_mismatches'] += 1
+
+    ok = (report['length_diff'] == 0 and report['detection_mismatches'] == 0
+          and report['value_mismatches'] == 0)
+    return ok, report
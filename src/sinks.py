@@ -0,0 +1,281 @@
+# src/sinks.py
+import os
+import queue
+import threading
+
+import cv2
+
+from debug_utils import create_debug_collage
+
+# Marks the end of a sink's queue
+_EOF = object()
+
+# Events a policy can select on (see EventTracker)
+EVENTS = ('loss', 'takeover')
+
+class SinkPolicy:
+    def __init__(self, every=0, events=()):
+        """
+        Decides which frames a sink gets.
+        every: every Nth frame (0 = none)
+        events: frames with any of these events ('loss', 'takeover')
+        """
+        self.every = every
+        self.events = set(events)
+
+    def selects(self, frame_id, events):
+        if self.every > 0 and frame_id % self.every == 0:
+            return True
+        return bool(self.events & events)
+
+def parse_policy(spec):
+    """
+    Parses a CLI policy: 'every:N', 'loss', 'takeover' or a comma-separated mix
+    (e.g. 'every:100,takeover'). Returns a SinkPolicy, or None for 'off'/empty.
+    """
+    if not spec or spec == 'off':
+        return None
+    every, events = 0, []
+    for part in spec.split(','):
+        part = part.strip()
+        if part.startswith('every:'):
+            every = int(part[len('every:'):])
+        elif part in EVENTS:
+            events.append(part)
+        else:
+            raise ValueError(f"Unknown sink policy '{part}' (use every:N, {', '.join(EVENTS)} or off)")
+    return SinkPolicy(every, events)
+
+class EventTracker:
+    def __init__(self):
+        """
+        Turns the per-frame Line state into events:
+        'loss': a line's fit failed on this frame after a good one
+        'takeover': the DRIVER TAKE OVER warning starts (a line was officially lost)
+        """
+        self.prev_failed = (False, False)
+        self.prev_both_detected = False
+
+    def update(self, left_line, right_line):
+        events = set()
+        failed = (left_line.frames_since_detected > 0, right_line.frames_since_detected > 0)
+        if any(now and not before for now, before in zip(failed, self.prev_failed)):
+            events.add('loss')
+        both_detected = left_line.detected and right_line.detected
+        if self.prev_both_detected and not both_detected:
+            events.add('takeover')
+
+        self.prev_failed = failed
+        self.prev_both_detected = both_detected
+        return events
+
+    def get_state(self):
+        return {'prev_failed': list(self.prev_failed), 'prev_both_detected': self.prev_both_detected}
+
+    def set_state(self, state):
+        self.prev_failed = tuple(state['prev_failed'])
+        self.prev_both_detected = state['prev_both_detected']
+
+
+class Sink:
+    # True if the sink wants the debug images (original, binary, warped) with the overlay
+    needs_debug = False
+
+    def __init__(self, policy=None, queue_size=8):
+        """
+        Writes items on its own thread, in submission order.
+        policy: SinkPolicy for the frames this sink gets (None = every frame)
+        queue_size: max items waiting; put() blocks when full (backpressure)
+        """
+        self.policy = policy or SinkPolicy(every=1)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.count = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _EOF:
+                self.queue.task_done()
+                break
+            if self.error is None: # Otherwise keep draining so the producer never blocks
+                try:
+                    self.handle(*item)
+                    self.count += 1
+                except Exception as e:
+                    print(f"Error in {type(self).__name__}: {e}")
+                    self.error = e
+            self.queue.task_done()
+
+    def put(self, frame_id, payload):
+        self.queue.put((frame_id, payload))
+
+    def handle(self, frame_id, payload):
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Waits until everything queued so far has been written (the sink stays open).
+        Raises the error of a failed write.
+        """
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def finish(self):
+        """
+        Releases the sink's resources once everything queued has been written.
+        """
+
+    def close(self):
+        """
+        Writes out what is queued, stops the thread and releases the sink.
+        Raises the error of a failed write (after releasing it).
+        """
+        self.queue.put(_EOF)
+        self.thread.join()
+        self.finish()
+        if self.error is not None:
+            raise self.error
+
+
+class CsvSink(Sink):
+    def __init__(self, csv_log, queue_size=8):
+        """
+        Per-frame log rows. csv_log: a CSVWriter or frame_log.FrameLogWriter.
+        payload: (csv_values, details) as for the log's write_values.
+        """
+        self.csv_log = csv_log
+        super().__init__(None, queue_size)
+
+    def handle(self, frame_id, payload):
+        csv_values, details = payload
+        self.csv_log.write_values(*csv_values, **(details or {}))
+
+
+class VideoSink(Sink):
+    def __init__(self, path, fps, img_size, policy=None, queue_size=8):
+        """
+        Annotated frames into one video (mp4v). payload: the overlay frame.
+        """
+        self.path = path
+        self.fps = fps
+        self.img_size = img_size
+        self.part_count = 0 # Frames in the current file
+        self.video_writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, img_size)
+        super().__init__(policy, queue_size)
+
+    def handle(self, frame_id, payload):
+        self.video_writer.write(payload)
+        self.part_count += 1
+
+    def start_part(self, path):
+        """
+        Finishes the current file (playable from now on) and continues in a new one.
+        Call after flush(). Returns the finished file, or None if it had no frames (removed).
+        """
+        self.video_writer.release()
+        finished = self.path
+        if self.part_count == 0:
+            if os.path.exists(finished):
+                os.remove(finished)
+            finished = None
+        self.path = path
+        self.part_count = 0
+        self.video_writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, self.img_size)
+        return finished
+
+    def finish(self):
+        self.video_writer.release()
+
+
+class JpegSink(Sink):
+    def __init__(self, directory, prefix, policy=None, queue_size=8, quality=90):
+        """
+        Annotated frames as <directory>/<prefix>_<frame_id>.jpg. payload: the overlay frame.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(policy, queue_size)
+
+    def handle(self, frame_id, payload):
+        path = os.path.join(self.directory, f"{self.prefix}_{frame_id:06d}.jpg")
+        cv2.imwrite(path, payload, self.params)
+
+
+class CollageSink(JpegSink):
+    needs_debug = True
+
+    def handle(self, frame_id, payload):
+        """
+        payload: debug image dict for create_debug_collage ('original', 'binary', 'warped', 'final').
+        """
+        path = os.path.join(self.directory, f"{self.prefix}_{frame_id:06d}_collage.jpg")
+        cv2.imwrite(path, create_debug_collage(payload), self.params)
+
+
+class OutputSinks:
+    def __init__(self, csv_sink=None, image_sinks=()):
+        """
+        Routes each processed frame to the sinks whose policy selects it.
+        csv_sink gets every frame; image_sinks (video, JPEG, collage) only their selected frames.
+        """
+        self.csv_sink = csv_sink
+        self.image_sinks = [sink for sink in image_sinks if sink is not None]
+        self.events = EventTracker()
+
+    def write(self, frame_id, left_line, right_line, csv_values, details=None, overlay=None,
+              render=None, debug=None):
+        """
+        Submits one frame. Call with the Line state right after processing the frame.
+        overlay: the annotated frame if it was rendered anyway, otherwise render() is
+        called (only if some sink selects this frame).
+        debug: callable returning the collage images (original, binary, warped), only
+        called for frames a collage sink selects.
+        Returns the set of events of this frame.
+        """
+        events = self.events.update(left_line, right_line)
+        if self.csv_sink is not None:
+            self.csv_sink.put(frame_id, (csv_values, details))
+
+        selected = [sink for sink in self.image_sinks if sink.policy.selects(frame_id, events)]
+        if not selected:
+            return events
+        if overlay is None:
+            overlay = render()
+
+        debug_images = None
+        for sink in selected:
+            if sink.needs_debug:
+                if debug_images is None:
+                    debug_images = dict(debug(), final=overlay)
+                sink.put(frame_id, debug_images)
+            else:
+                sink.put(frame_id, overlay)
+        return events
+
+    def flush(self):
+        """
+        Waits until every sink has written everything submitted so far (e.g. before a checkpoint).
+        """
+        for sink in self.image_sinks + ([self.csv_sink] if self.csv_sink is not None else []):
+            sink.flush()
+
+    def close(self):
+        """
+        Waits until every sink has written everything queued and closes them all,
+        then raises the first sink error.
+        """
+        error = None
+        for sink in self.image_sinks + ([self.csv_sink] if self.csv_sink is not None else []):
+            try:
+                sink.close()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
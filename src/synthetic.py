@@ -0,0 +1,36 @@
+# src/synthetic.py
+import cv2
+import numpy as np
+
+# Lane trapezoid in data/road.png (1159x662), order: TL, TR, BR, BL
+ROAD_SRC_POINTS = np.float32([[522, 440], [738, 440], [1060, 636], [217, 636]])
+
+def synthetic_frames(image, n_frames, seed=0, max_shift=12, dropout_every=25):
+    """
+    Deterministic synthetic clip from a single road image.
+    Each frame gets a small lateral shift, a brightness change and sensor noise;
+    every 'dropout_every'-th frame is nearly black (tunnel / exposure dropout).
+    Yields BGR frames of the same size as image.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    
+    for i in range(n_frames):
+        # Slow lateral drift (the car weaving in the lane)
+        dx = max_shift * np.sin(2 * np.pi * i / 60)
+        shift = np.float32([[1, 0, dx], [0, 1, 0]])
+        frame = cv2.warpAffine(image, shift, (width, height), borderMode=cv2.BORDER_REPLICATE)
+        
+        # Brightness change
+        beta = 20 * np.sin(2 * np.pi * i / 45)
+        frame = cv2.convertScaleAbs(frame, alpha=1.0, beta=beta)
+        
+        # Sensor noise
+        noise = rng.normal(0, 4, frame.shape).astype(np.int16)
+        frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        
+        # Dropout
+        if dropout_every and i % dropout_every == dropout_every - 1:
+            frame = (frame * 0.15).astype(np.uint8)
+        
+        yield frame
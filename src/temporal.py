@@ -18,6 +18,25 @@ class Line:
         self.frames_since_detected = 0
         self.max_frames_lost = max_frames_lost # Frames to wait before triggering "TAKE OVER"
 
+    def get_state(self):
+        """
+        The tracking state as plain (JSON-friendly) values, e.g. for a checkpoint.
+        """
+        return {'detected': bool(self.detected),
+                'current_fit': None if self.current_fit is None else self.current_fit.tolist(),
+                'confidence': float(self.confidence), 'pixel_count': int(self.pixel_count),
+                'frames_since_detected': int(self.frames_since_detected)}
+
+    def set_state(self, state):
+        """
+        Restores a state from get_state (the smoothing parameters stay as they are).
+        """
+        self.detected = state['detected']
+        self.current_fit = None if state['current_fit'] is None else np.array(state['current_fit'])
+        self.confidence = state['confidence']
+        self.pixel_count = state['pixel_count']
+        self.frames_since_detected = state['frames_since_detected']
+
     def calculate_confidence(self, pixel_count):
         # A simple confidence score based on pixel count
         # min_pix (50) is 0%, 2000+ pixels is 100%
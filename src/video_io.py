@@ -0,0 +1,58 @@
+# src/video_io.py
+import queue
+import threading
+
+# Marks the end of a queue
+_EOF = object()
+
+class FrameReader:
+    def __init__(self, cap, queue_size=8):
+        """
+        Decodes frames from a cv2.VideoCapture on a background thread.
+        cap: an opened cv2.VideoCapture
+        queue_size: max number of decoded frames waiting to be processed
+        """
+        self.cap = cap
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # Blocks while the queue is full (backpressure), unless we are stopping
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            if not self._put(frame):
+                break
+        self._put(_EOF)
+
+    def read(self):
+        """
+        Same contract as cv2.VideoCapture.read(): returns (ret, frame).
+        """
+        item = self.queue.get()
+        if item is _EOF:
+            # Keep returning EOF on later calls
+            self.queue.put(_EOF)
+            return False, None
+        return True, item
+
+    def stop(self):
+        """
+        Stops the reader thread (e.g. on 'q'). The capture can be released afterwards.
+        """
+        self._stop.set()
+        self.thread.join()
+
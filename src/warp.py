@@ -1,13 +1,15 @@
 # src/warp.py
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 
 def get_user_warp_points(frame):
     """
     Displays the frame and waits for the user to click 4 points.
     Returns the selected source points.
     """
+    # Imported here: matplotlib is slow to load and only needed for interactive calibration
+    import matplotlib.pyplot as plt
+    
     # Convert to RGB for matplotlib
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     
@@ -57,11 +59,151 @@ def get_warp_matrices(img_size, src_points):
     
     return M, Minv
 
-def warp_image(image, M):
+def get_warp_roi(img_size, Minv, pad=2):
+    """
+    Bounding box (x0, y0, x1, y1) of the source pixels that map into the bird's-eye view.
+    pad: extra pixels around the box (Sobel/interpolation neighbourhood).
+    Returns None if the view reaches above the horizon (the whole frame is needed then).
+    """
+    width, height = img_size
+    
+    # Corners of the warped image, mapped back into the original image
+    corners = np.float64([[0, 0, 1], [width, 0, 1], [width, height, 1], [0, height, 1]])
+    mapped = corners @ Minv.T
+    if np.any(mapped[:, 2] <= 0):
+        return None # Behind the camera / above the horizon
+    pts = mapped[:, :2] / mapped[:, 2:]
+    
+    x0 = int(np.clip(np.floor(pts[:, 0].min()) - pad, 0, width))
+    x1 = int(np.clip(np.ceil(pts[:, 0].max()) + pad, 0, width))
+    y0 = int(np.clip(np.floor(pts[:, 1].min()) - pad, 0, height))
+    y1 = int(np.clip(np.ceil(pts[:, 1].max()) + pad, 0, height))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+def roi_warp_matrix(M, roi):
+    """
+    Warp matrix for a sub-image cropped at roi: M applied after shifting back to full-frame coordinates.
+    """
+    x0, y0 = roi[0], roi[1]
+    shift = np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], dtype=np.float64)
+    return M @ shift
+
+def scale_homography(M, scale):
+    """
+    Same perspective transform for images resized by 'scale' (both input and output).
+    """
+    S = np.diag([scale, scale, 1.0])
+    return S @ M @ np.diag([1 / scale, 1 / scale, 1.0])
+
+def warp_image(image, M, img_size=None):
     """
     Applies the perspective warp using the matrix M.
+    img_size: (width, height) of the output, defaults to the input size.
     """
-    img_size = (image.shape[1], image.shape[0])
+    if img_size is None:
+        img_size = (image.shape[1], image.shape[0])
     # Warp the image to a top-down ("bird's-eye") view
     warped = cv2.warpPerspective(image, M, img_size, flags=cv2.INTER_LINEAR)
-    return warped
\ No newline at end of file
+    return warped
+
+class PerspectiveWarp:
+    def __init__(self, M, Minv, img_size):
+        """
+        Precomputed fixed-point remap tables for the forward (M) warp.
+        Built once after calibration; applying them costs a table lookup per pixel
+        instead of a projective transform.
+        img_size: (width, height) of both the original and the warped image
+        """
+        self.M = np.float64(M)
+        self.Minv = np.float64(Minv)
+        self.img_size = tuple(int(v) for v in img_size)
+        
+        # warpPerspective(img, M) samples img at M^-1 * (x, y) for each output pixel
+        self.forward_maps = self._build_maps(np.linalg.inv(self.M))
+        
+        # Forward maps shifted for cropped (ROI) inputs, built on first use
+        self._roi_maps = {}
+
+    def _build_maps(self, H, shift=(0, 0)):
+        """
+        Compact (CV_16SC2 + interpolation table) maps sampling the source at H * (x, y).
+        Returns {'nearest': (map1, None), 'linear': (map1, map2)}.
+        """
+        width, height = self.img_size
+        H = H / H[2, 2] # Same scale as getPerspectiveTransform (w > 0 in front of the camera)
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        
+        w = H[2, 0]*xs + H[2, 1]*ys + H[2, 2]
+        valid = w > 0 # Points behind the camera map nowhere
+        w = np.where(valid, w, 1.0)
+        map_x = (H[0, 0]*xs + H[0, 1]*ys + H[0, 2]) / w - shift[0]
+        map_y = (H[1, 0]*xs + H[1, 1]*ys + H[1, 2]) / w - shift[1]
+        
+        # Out-of-image samples -> border (0). Clipping also keeps them inside int16
+        map_x = np.where(valid, np.clip(map_x, -2, width + 2), -2).astype(np.float32)
+        map_y = np.where(valid, np.clip(map_y, -2, height + 2), -2).astype(np.float32)
+        
+        nearest = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=True)
+        linear = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        return {'nearest': (nearest[0], None), 'linear': linear}
+
+    @staticmethod
+    def _remap(image, maps, interpolation, out=None):
+        if interpolation == cv2.INTER_NEAREST:
+            map1, map2 = maps['nearest']
+        else:
+            map1, map2 = maps['linear']
+            interpolation = cv2.INTER_LINEAR
+        return cv2.remap(image, map1, map2, interpolation, dst=out, borderMode=cv2.BORDER_CONSTANT)
+
+    def warp(self, image, interpolation=cv2.INTER_NEAREST, roi=None, out=None):
+        """
+        Bird's-eye view of image (same as warp_image(image, M)).
+        Nearest-neighbour by default, which is exact enough for the 0/1 mask.
+        roi: (x0, y0, x1, y1) if image is a crop of the full frame (see get_warp_roi).
+        out: optional result buffer (img_size, same type as image) to reuse across frames.
+        """
+        maps = self.forward_maps
+        if roi is not None:
+            if roi not in self._roi_maps:
+                self._roi_maps[roi] = self._build_maps(np.linalg.inv(self.M), shift=roi[:2])
+            maps = self._roi_maps[roi]
+        return self._remap(image, maps, interpolation, out)
+
+    def save(self, path):
+        """
+        Stores the maps (e.g. next to the calibration) so later runs can skip building them.
+        """
+        np.savez(path, M=self.M, Minv=self.Minv, img_size=np.int64(self.img_size),
+                 fwd_nearest=self.forward_maps['nearest'][0],
+                 fwd_linear_1=self.forward_maps['linear'][0], fwd_linear_2=self.forward_maps['linear'][1])
+
+    @classmethod
+    def load(cls, path, M=None, Minv=None, img_size=None):
+        """
+        Loads maps saved with save(). If M/Minv/img_size are given and do not match
+        the stored ones, returns None (the maps are stale).
+        """
+        try:
+            data = np.load(path)
+        except (IOError, ValueError) as e:
+            print(f"Error loading warp maps: {e}")
+            return None
+        
+        if M is not None and not np.allclose(data['M'], M):
+            return None
+        if Minv is not None and not np.allclose(data['Minv'], Minv):
+            return None
+        if img_size is not None and tuple(data['img_size']) != tuple(img_size):
+            return None
+        
+        warper = cls.__new__(cls)
+        warper.M = data['M']
+        warper.Minv = data['Minv']
+        warper.img_size = tuple(int(v) for v in data['img_size'])
+        warper.forward_maps = {'nearest': (data['fwd_nearest'], None),
+                               'linear': (data['fwd_linear_1'], data['fwd_linear_2'])}
+        warper._roi_maps = {}
+        return warper
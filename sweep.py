@@ -0,0 +1,210 @@
+# sweep.py
+import cv2
+import numpy as np
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import random
+import time
+from pathlib import Path
+import sys
+
+# Add the 'src' directory to the Python path
+sys.path.append(str(Path(__file__).parent / 'src'))
+
+from calibration import load_calibration
+from config import DEFAULT_CONFIG, save_config
+from detector import LaneDetector, fit_lanes, lane_metrics
+from mask_cache import MaskCacheWriter, cache_path, load_mask_cache, iter_masks
+from segmented import init_worker
+from temporal import Line
+
+SCORE_HEADERS = ['detection_rate', 'offset_mae_m', 'jitter_m', 'score']
+
+def load_space(path):
+    """
+    Search space from a JSON file {parameter: [values, ...]} (parameters of config.LaneConfig).
+    """
+    with open(path) as f:
+        space = json.load(f)
+    unknown = set(space) - set(DEFAULT_CONFIG.to_dict())
+    if unknown:
+        raise ValueError(f"Unknown config parameter(s): {', '.join(sorted(unknown))}")
+    for name, values in space.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"'{name}' needs a non-empty list of values")
+    return space
+
+def sample_configs(space, n_random=0, seed=0):
+    """
+    All combinations of the space (grid), or n_random distinct ones drawn from it.
+    Returns a list of (params dict, LaneConfig).
+    """
+    names = list(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    if 0 < n_random < len(grid):
+        grid = random.Random(seed).sample(grid, n_random)
+    return [(dict(zip(names, values)), DEFAULT_CONFIG.replace(**dict(zip(names, values)))) for values in grid]
+
+def load_reference(path):
+    """
+    Per-frame reference log (run_pipeline.py CSV format) -> (both lines detected, lat_offset_m) arrays.
+    """
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    detected = np.array([row['left_detected'] == '1' and row['right_detected'] == '1' for row in rows])
+    offsets = np.array([float(row['lat_offset_m']) for row in rows])
+    return detected, offsets
+
+def score_run(detected, offsets, ref_detected, ref_offsets):
+    """
+    detection_rate: frames with both lines detected
+    offset_mae_m: mean |offset - reference offset| over frames detected in both runs
+    jitter_m: RMS of the frame-to-frame offset change over consecutive detected frames
+    score: detection_rate - offset_mae_m - jitter_m (1 cm of error costs 1% of detection rate)
+    """
+    n = min(len(detected), len(ref_detected))
+    detected, offsets = detected[:n], offsets[:n]
+    both = detected & ref_detected[:n]
+    steady = detected[1:] & detected[:-1]
+
+    detection_rate = float(np.mean(detected)) if n else 0.0
+    offset_mae = float(np.mean(np.abs(offsets[both] - ref_offsets[:n][both]))) if both.any() else float('nan')
+    jitter = float(np.sqrt(np.mean(np.diff(offsets)[steady] ** 2))) if steady.any() else float('nan')
+    score = detection_rate - np.nan_to_num(offset_mae, nan=1.0) - np.nan_to_num(jitter, nan=1.0)
+    return {'detection_rate': detection_rate, 'offset_mae_m': offset_mae, 'jitter_m': jitter, 'score': score}
+
+def record_masks(job):
+    """
+    Worker: decodes the clip once and caches the warped masks of one preprocessing config.
+    """
+    input_path, calibration, preprocess_mode, scale, config, path = job
+    detector = LaneDetector(calibration, preprocess_mode, scale, render=False, config=config)
+    writer = MaskCacheWriter(path, {'input': input_path, 'preprocess': preprocess_mode, 'scale': scale,
+                                    **config.preprocess_settings()})
+    cap = cv2.VideoCapture(input_path)
+    while True:
+        ret, frame = cap.read()
+        if not ret: break
+        writer.append(detector.warped_mask(frame))
+    cap.release()
+    writer.close()
+    return path
+
+def evaluate(job):
+    """
+    Worker: replays the cached masks of a config through lane fitting and smoothing and scores it.
+    """
+    index, params, config, path, calibration, scale, reference = job
+    packed, info = load_mask_cache(path)
+    img_size = tuple(calibration['img_size'])
+    left_line = Line(alpha=config.alpha, max_frames_lost=config.max_frames_lost)
+    right_line = Line(alpha=config.alpha, max_frames_lost=config.max_frames_lost)
+
+    detected = np.zeros(len(packed), dtype=bool)
+    offsets = np.zeros(len(packed))
+    for i, mask in enumerate(iter_masks(packed, info['width'])):
+        fit_lanes(mask, left_line, right_line, scale=scale, config=config)
+        offsets[i], _ = lane_metrics(left_line, right_line, img_size, calibration['xm_per_pix'],
+                                     calibration['ym_per_pix'])
+        detected[i] = left_line.detected and right_line.detected
+    # Same precision as the CSV logs
+    offsets = np.round(offsets, 2)
+    return index, params, score_run(detected, offsets, *reference)
+
+def main(args):
+    calibration = load_calibration(args.calibration, args.camera)
+    if calibration is None:
+        print(f"Error: No calibration '{args.camera}' in {args.calibration} "
+              f"(create it with run_pipeline.py --calibration ... --camera ...)")
+        return 2
+    try:
+        space = load_space(args.space)
+        configs = sample_configs(space, args.random, args.seed)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error: Invalid search space {args.space}: {e}")
+        return 2
+    reference = load_reference(args.reference)
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache_dir = args.mask_cache or str(output_dir / 'masks')
+    input_path = str(Path(args.input))
+
+    # 1. One mask cache per distinct preprocessing (the configs in between only change fitting)
+    mask_paths = []
+    record_jobs = {}
+    for params, config in configs:
+        settings = {'preprocess': args.preprocess, 'scale': args.scale, **config.preprocess_settings()}
+        path = cache_path(cache_dir, input_path, calibration['M'], settings)
+        mask_paths.append(path)
+        if path not in record_jobs and load_mask_cache(path) is None:
+            record_jobs[path] = (input_path, calibration, args.preprocess, args.scale, config, path)
+
+    n_masks = len(set(mask_paths))
+    print(f"Sweeping {len(configs)} configs ({n_masks} distinct preprocessing, "
+          f"{n_masks - len(record_jobs)} cached) with {args.workers} workers...")
+    start = time.perf_counter()
+    with multiprocessing.Pool(max(1, args.workers), initializer=init_worker) as pool:
+        for path in pool.imap_unordered(record_masks, record_jobs.values()):
+            print(f"  cached masks: {path}")
+
+        # 2. Fit, smooth and score every config on its masks
+        jobs = [(i, params, config, path, calibration, args.scale, reference)
+                for i, ((params, config), path) in enumerate(zip(configs, mask_paths))]
+        results = []
+        for index, params, scores in pool.imap_unordered(evaluate, jobs):
+            results.append((index, params, scores))
+            if len(results) % 10 == 0 or len(results) == len(jobs):
+                print(f"  ... scored {len(results)}/{len(jobs)} configs")
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda result: -result[2]['score'])
+    results_path = output_dir / 'sweep_results.csv'
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank'] + list(space) + SCORE_HEADERS)
+        for rank, (_, params, scores) in enumerate(results, 1):
+            writer.writerow([rank] + [json.dumps(params[name]) for name in space] +
+                            [f"{scores[name]:.4f}" for name in SCORE_HEADERS])
+
+    ref_rate = float(np.mean(reference[0])) if len(reference[0]) else 0.0
+    print(f"Sweep complete: {len(results)} configs in {elapsed:.1f} s (reference detection rate {ref_rate:.3f})")
+    for rank, (_, params, scores) in enumerate(results[:5], 1):
+        print(f"  {rank}. score {scores['score']:.4f}, detection {scores['detection_rate']:.3f}, "
+              f"offset MAE {scores['offset_mae_m']:.3f} m, jitter {scores['jitter_m']:.3f} m: {params}")
+
+    best_path = output_dir / 'best_config.json'
+    save_config(str(best_path), configs[results[0][0]][1])
+    print(f"Saved results to: {results_path}")
+    print(f"Saved the best config to: {best_path} (use with run_pipeline.py --config)")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Grid or random search over the pipeline thresholds "
+                                                 "(src/config.py), scored against a reference per-frame CSV.")
+    parser.add_argument('input', help="Video to tune on")
+    parser.add_argument('--space', required=True,
+                        help="JSON file {parameter: [values, ...]}, e.g. {\"margin\": [60, 100], \"alpha\": [0.05, 0.1]}")
+    parser.add_argument('--reference', required=True,
+                        help="Reference per-frame CSV of this video (run_pipeline.py format)")
+    parser.add_argument('--calibration', required=True,
+                        help="JSON calibration profiles file (see run_pipeline.py --calibration)")
+    parser.add_argument('--camera', default='default', help="Calibration profile to use (default: 'default')")
+    parser.add_argument('--random', type=int, default=0,
+                        help="Evaluate N random configs of the space instead of the full grid")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for --random")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument('--output', default='sweep', help="Output directory (results, best config, masks)")
+    parser.add_argument('--mask-cache', default=None,
+                        help="Directory of the warped mask caches (default: <output>/masks; shared with "
+                             "run_pipeline.py --mask-cache)")
+    parser.add_argument('--preprocess', choices=['full', 'roi', 'warped'], default='full',
+                        help="Preprocessing mode, see run_pipeline.py")
+    parser.add_argument('--scale', type=float, default=1.0, help="Processing resolution, see run_pipeline.py")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,22 @@
+# tests/conftest.py
+from pathlib import Path
+import sys
+
+import cv2
+import pytest
+
+# Same import layout as the scripts in the project root
+sys.path.append(str(Path(__file__).parent.parent / 'src'))
+
+@pytest.fixture(scope='session')
+def data_dir():
+    return Path(__file__).parent.parent / 'data'
+
+@pytest.fixture(scope='session')
+def road(data_dir):
+    """
+    The sample road frame (data/road.png), BGR.
+    """
+    image = cv2.imread(str(data_dir / 'road.png'))
+    assert image is not None
+    return image
@@ -0,0 +1,54 @@
+# tests/test_calibration.py
+import numpy as np
+import pytest
+
+from calibration import auto_calibrate, check_warp_points
+from preprocess import preprocess_image
+from synthetic import ROAD_SRC_POINTS
+
+def line_x(top, bottom, y):
+    """
+    x of the line through two (x, y) points at row(s) y.
+    """
+    (x0, y0), (x1, y1) = top, bottom
+    return x0 + (x1 - x0) * (np.asarray(y, dtype=np.float64) - y0) / (y1 - y0)
+
+def side_lines(src_points):
+    tl, tr, br, bl = src_points
+    return {'left': (tl, bl), 'right': (tr, br)}
+
+@pytest.fixture(scope='module')
+def estimate(road):
+    src_points = auto_calibrate([road])
+    assert src_points is not None
+    return src_points
+
+def test_close_to_road_src_points(estimate):
+    # Compare the lane lines at the corner rows of ROAD_SRC_POINTS (the two trapezoids
+    # do not use the same top/bottom rows). The hand-clicked points are a loose reference:
+    # the left marking is dashed and ends around row 540, so its bottom corner is extrapolated.
+    rows = [ROAD_SRC_POINTS[0][1], ROAD_SRC_POINTS[2][1]]
+    expected, estimated = side_lines(ROAD_SRC_POINTS), side_lines(estimate)
+    for side in ('left', 'right'):
+        diff = np.abs(line_x(*estimated[side], rows) - line_x(*expected[side], rows))
+        assert diff.max() < 45, (side, diff)
+
+def test_follows_the_markings(road, estimate):
+    # Where a marking is visible, the estimated line runs through its centre
+    mask = preprocess_image(road)
+    for side, (top, bottom) in side_lines(estimate).items():
+        errors = []
+        for y in range(int(top[1]), int(bottom[1])):
+            x = line_x(top, bottom, y)
+            xs = np.flatnonzero(mask[y, max(0, int(x) - 25):int(x) + 25]) + max(0, int(x) - 25)
+            if len(xs) >= 5:
+                errors.append(abs(xs.mean() - x))
+        assert len(errors) > 20, side
+        assert np.median(errors) < 5, (side, np.median(errors))
+
+def test_passes_sanity_check(road, estimate):
+    assert check_warp_points([road], estimate) == 1.0
+
+def test_blank_frame_fails():
+    blank = np.zeros((662, 1159, 3), dtype=np.uint8)
+    assert auto_calibrate([blank]) is None
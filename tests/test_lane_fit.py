@@ -0,0 +1,74 @@
+# tests/test_lane_fit.py
+import numpy as np
+import pytest
+
+from lane_fit import FitMoments, blind_search, fit_quadratic, near_weights
+
+HEIGHT = 720
+
+def lane_pixels(fit, n=2000, seed=0, noise=3.0):
+    """
+    Noisy pixels of x = A*y^2 + B*y + C over the image height.
+    """
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, HEIGHT, n)
+    x = np.polyval(fit, y) + rng.normal(0, noise, n)
+    return x, y
+
+def lane_mask(left_fit, right_fit, width=1280):
+    """
+    Warped binary mask with two 20 px wide lines.
+    """
+    mask = np.zeros((HEIGHT, width), dtype=np.uint8)
+    y = np.arange(HEIGHT)
+    for fit in (left_fit, right_fit):
+        x = np.polyval(fit, y).astype(int)
+        for dx in range(-10, 10):
+            mask[y, np.clip(x + dx, 0, width - 1)] = 1
+    return mask
+
+@pytest.mark.parametrize('fit', [[2e-4, -0.15, 330.0], [-3e-4, 0.3, 950.0], [0.0, 0.0, 640.0]])
+def test_matches_polyfit(fit):
+    x, y = lane_pixels(fit)
+    np.testing.assert_allclose(fit_quadratic(x, y), np.polyfit(y, x, 2), rtol=1e-6, atol=1e-9)
+
+def test_weighted_matches_polyfit():
+    x, y = lane_pixels([2e-4, -0.15, 330.0])
+    weights = near_weights(y, HEIGHT, 2.0)
+    np.testing.assert_allclose(fit_quadratic(x, y, weights), np.polyfit(y, x, 2, w=np.sqrt(weights)),
+                               rtol=1e-6, atol=1e-9)
+
+def test_few_rows():
+    # Pixels over a short stretch of rows are still fitted like np.polyfit does
+    x, y = lane_pixels([1e-4, 0.1, 500.0], n=200)
+    x, y = x[y < 40], y[y < 40]
+    np.testing.assert_allclose(fit_quadratic(x, y), np.polyfit(y, x, 2), rtol=1e-4, atol=1e-6)
+
+@pytest.mark.parametrize('x, y', [
+    ([], []),                                 # no pixels
+    ([100, 101], [10, 20]),                   # fewer than 3 pixels
+    ([100, 105, 110, 115], [50] * 4),         # a single row
+    ([100, 105, 110, 115], [50, 50, 60, 60]), # two rows
+])
+def test_degenerate_input(x, y):
+    assert fit_quadratic(np.array(x), np.array(y)) is None
+    moments = FitMoments(HEIGHT)
+    moments.add(np.array(x), np.array(y))
+    assert moments.solve() is None
+
+def test_moments_add_up():
+    x, y = lane_pixels([2e-4, -0.15, 330.0])
+    moments = FitMoments(HEIGHT, near_weight=1.0)
+    for part in np.array_split(np.arange(len(y)), 9):
+        moments.add(x[part], y[part])
+    np.testing.assert_allclose(moments.solve(), fit_quadratic(x, y, near_weights(y, HEIGHT, 1.0)),
+                               rtol=1e-6, atol=1e-9)
+
+def test_window_moments_match_found_pixels():
+    # The sums accumulated window by window fit the same as the pixels the search returns
+    mask = lane_mask([1e-4, -0.1, 350.0], [1e-4, -0.1, 1030.0])
+    moments = (FitMoments(HEIGHT), FitMoments(HEIGHT))
+    leftx, lefty, rightx, righty, _ = blind_search(mask, moments=moments)
+    assert moments[0].count == len(leftx) and moments[1].count == len(rightx)
+    np.testing.assert_allclose(moments[0].solve(), np.polyfit(lefty, leftx, 2), rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(moments[1].solve(), np.polyfit(righty, rightx, 2), rtol=1e-6, atol=1e-9)
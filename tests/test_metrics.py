@@ -0,0 +1,44 @@
+# tests/test_metrics.py
+import numpy as np
+import pytest
+
+from metrics import compute_metrics, curvature_radius_m, lateral_offset_m
+
+XM, YM = 3.7 / 680, 30 / 720
+
+@pytest.fixture
+def fits():
+    rng = np.random.default_rng(0)
+    left = np.column_stack([rng.uniform(-5e-4, 5e-4, 50), rng.uniform(-0.5, 0.5, 50), rng.uniform(250, 400, 50)])
+    right = left + [0.0, 0.0, 680.0]
+    return left, right
+
+@pytest.mark.parametrize('img_size', [(1280, 720), (640, 360)])
+def test_matches_per_frame(fits, img_size):
+    left, right = fits
+    width, height = img_size
+    offsets, left_curves, right_curves = compute_metrics(left, right, img_size, XM, YM)
+    for i in range(len(left)):
+        assert offsets[i] == pytest.approx(lateral_offset_m(left[i], right[i], width, height - 1, XM))
+        assert left_curves[i] == pytest.approx(curvature_radius_m(left[i], height - 1, XM, YM))
+        assert right_curves[i] == pytest.approx(curvature_radius_m(right[i], height - 1, XM, YM))
+
+def test_single_pair(fits):
+    left, right = fits
+    offset, left_curve, right_curve = compute_metrics(left[0], right[0], (1280, 720), XM, YM)
+    assert np.ndim(offset) == 0 and np.ndim(left_curve) == 0
+    assert offset == pytest.approx(compute_metrics(left, right, (1280, 720), XM, YM)[0][0])
+
+def test_straight_lane():
+    # Lane centred 40 px right of the image centre: the car is 40 px left of the lane centre
+    offset, left_curve, right_curve = compute_metrics([[0, 0, 340]], [[0, 0, 1020]], (1280, 720), XM, YM)
+    assert offset[0] == pytest.approx(-40 * XM)
+    assert np.isinf(left_curve[0]) and np.isinf(right_curve[0])
+
+def test_missing_fits_give_nan(fits):
+    left, right = fits
+    left = left.copy()
+    left[3] = np.nan
+    offsets, left_curves, right_curves = compute_metrics(left, right, (1280, 720), XM, YM)
+    assert np.isnan(offsets[3]) and np.isnan(left_curves[3]) and not np.isnan(right_curves[3])
+    assert not np.isnan(np.delete(offsets, 3)).any()
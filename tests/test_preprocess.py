@@ -0,0 +1,47 @@
+# tests/test_preprocess.py
+import cv2
+import numpy as np
+
+from preprocess import preprocess_image
+
+def reference_preprocess(image):
+    """
+    The original float64 / np.zeros_like implementation, kept as the parity reference.
+    """
+    hls = cv2.cvtColor(image, cv2.COLOR_BGR2HLS)
+    s_channel = hls[:, :, 2]
+    l_channel = hls[:, :, 1]
+
+    s_binary = np.zeros_like(s_channel)
+    s_binary[(s_channel >= 100) & (s_channel <= 255)] = 1
+
+    l_binary = np.zeros_like(l_channel)
+    l_binary[(l_channel >= 120) & (l_channel <= 255)] = 1
+
+    sobelx = cv2.Sobel(l_channel, cv2.CV_64F, 1, 0)
+    abs_sobelx = np.absolute(sobelx)
+    scaled_sobel = np.uint8(255 * abs_sobelx / (np.max(abs_sobelx) + 1e-6))
+    sx_binary = np.zeros_like(scaled_sobel)
+    sx_binary[(scaled_sobel >= 20) & (scaled_sobel <= 120)] = 1
+
+    combined_binary = np.zeros_like(sx_binary)
+    combined_binary[(s_binary == 1) | ((sx_binary == 1) & (l_binary == 1))] = 1
+    return combined_binary
+
+def test_parity_on_road(road):
+    assert np.array_equal(preprocess_image(road), reference_preprocess(road))
+
+def test_parity_with_buffers(road):
+    buffers = {}
+    expected = reference_preprocess(road)
+    # Second call runs on the reused scratch images
+    for _ in range(2):
+        assert np.array_equal(preprocess_image(road, buffers=buffers), expected)
+    out = np.empty(road.shape[:2], dtype=np.uint8)
+    assert preprocess_image(road, out=out, buffers=buffers) is out
+    assert np.array_equal(out, expected)
+
+def test_parity_on_blank_frame():
+    # No edges at all (max |Sobel| is 0)
+    blank = np.full((72, 128, 3), 90, dtype=np.uint8)
+    assert np.array_equal(preprocess_image(blank), reference_preprocess(blank))